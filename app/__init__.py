@@ -5,10 +5,12 @@ from flask_login import LoginManager, current_user
 from flask_migrate import Migrate
 from app.db import db  # importar la instancia central de db
 from app.routes.main import main_bp
+from app.routes.metrics import metrics_bp
 from app.routes.goals import goals_bp
 from app.routes.categories import categories_bp
 from app.routes.herramientas import herramientas_bp
 from app.routes.schedule import schedule_bp
+from app.routes.search import search_bp
 from app.routes.tasks import tasks_api, tasks_page
 from config import Config
 
@@ -22,10 +24,62 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    # Inicializar la base de datos
+    # Inicializar la base de datos, con el pool configurado desde el entorno
+    from app.utils import pool
+    pool.configure(app)
     db.init_app(app)
+    pool.init_app(app)
+
+    # Con SQLite: WAL, pragmas y, opcionalmente, un escritor a la vez
+    from app.utils import sqlite
+    sqlite.init_app(app)
     from app import models
 
+    # Estadísticas materializadas y contadores del panel
+    from app.utils import counters, stats
+    stats.init_app(app)
+    counters.init_app(app)
+
+    # Caché de ocurrencias RRULE de las tareas
+    from app.utils import recurrence
+    recurrence.init_app(app)
+
+    # Secuencia de cambios y lápidas para la sincronización incremental
+    from app.utils import sync
+    sync.init_app(app)
+
+    # Claves de orden de las listas (flask order rebalance)
+    from app.utils import ordering
+    ordering.init_app(app)
+
+    # Hash de contraseñas en un pool acotado (flask passwords bench)
+    from app.utils import hashing
+    hashing.init_app(app)
+
+    # Identidad cacheada del usuario de la sesión (user_loader sin consulta)
+    from app.utils import identity
+    identity.init_app(app)
+
+    # Contadores de escrituras por recurso para los ETag
+    from app.utils import etags
+    etags.init_app(app)
+
+    # Índice de búsqueda de texto completo (flask search reindex)
+    from app.utils import search
+    search.init_app(app)
+
+    # Serializadores de los modelos y codificador JSON (orjson si está instalado)
+    from app.utils import serializers
+    serializers.init_app(app)
+
+    # Prueba de carga entre modos de gunicorn (flask loadtest compare)
+    from app.utils import loadtest
+    loadtest.init_app(app)
+
+    # Comprobación de planes de las consultas calientes (flask plans check)
+    from app.utils import query_plans
+    query_plans.init_app(app)
+
     # Inicializar migraciones, activando render_as_batch para SQLite
     if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
         migrate = Migrate(app, db, render_as_batch=True)
@@ -46,6 +100,7 @@ def create_app(config_class=Config):
     app.register_blueprint(goals_bp)
     app.register_blueprint(categories_bp)
     app.register_blueprint(herramientas_bp)
+    app.register_blueprint(metrics_bp)
 
     from app.routes.auth import auth_bp
     app.register_blueprint(auth_bp)
@@ -54,5 +109,6 @@ def create_app(config_class=Config):
     app.register_blueprint(tasks_api)   # /api/events
 
     app.register_blueprint(schedule_bp)
+    app.register_blueprint(search_bp)   # /api/search
 
     return app
@@ -1,11 +1,14 @@
 
-from sqlalchemy import JSON
+from sqlalchemy import JSON, event, inspect
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date
 from app.db import db
+from app.utils.hashing import hash_password, needs_rehash, verify_password
 from datetime import timezone
 
+# Claves de orden fraccionarias (app/utils/ordering.py): se comparan byte
+# a byte, así que en Postgres se fuerza la intercalación "C"
+OrderKey = db.String(64).with_variant(db.String(64, collation='C'), 'postgresql')
 
 
 # =======================
@@ -18,16 +21,66 @@ class User(UserMixin, db.Model):
     passwords = db.relationship('PasswordEntry', back_populates='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
+
+
+# =======================
+# ESTADÍSTICAS MATERIALIZADAS POR USUARIO
+# =======================
+class UserStats(db.Model):
+    """
+    Totales de tareas y metas de un usuario, mantenidos al escribir
+    (ver app/utils/stats.py) para que el panel los lea en O(1).
+    """
+    __tablename__ = 'user_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_user_stats_user_id'), primary_key=True)
+    total_tasks = db.Column(db.Integer, nullable=False, default=0)
+    done_tasks = db.Column(db.Integer, nullable=False, default=0)
+    total_goals = db.Column(db.Integer, nullable=False, default=0)
+    done_goals = db.Column(db.Integer, nullable=False, default=0)
+    # Secuencia monótona de cambios en tareas/subtareas (token de sincronización)
+    task_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Lápidas purgadas hasta esta secuencia: los tokens anteriores ya no sirven
+    task_seq_min = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Contadores de escrituras por recurso para los ETag (ver app/utils/etags.py)
+    goal_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    category_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    schedule_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    template_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    diario_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def pending_tasks(self):
+        return self.total_tasks - self.done_tasks
+
+    @property
+    def percent_tasks(self):
+        return round((self.done_tasks / self.total_tasks * 100), 2) if self.total_tasks > 0 else 0
+
+    @property
+    def percent_goals(self):
+        return round((self.done_goals / self.total_goals * 100), 2) if self.total_goals > 0 else 0
+
+    def __repr__(self):
+        return f"<UserStats {self.user_id}>"
 
 
 # =======================
 # CATEGORÍAS
 # =======================
 class Category(db.Model):
+    __table_args__ = (
+        db.Index('ix_category_user_id_name', 'user_id', 'name'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(60), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -41,6 +94,10 @@ class Category(db.Model):
 # METAS
 # =======================
 class Goal(db.Model):
+    __table_args__ = (
+        db.Index('ix_goal_user_id_position', 'user_id', 'position'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(250), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
@@ -48,10 +105,15 @@ class Goal(db.Model):
     completed = db.Column(db.Boolean, default=False)
     due_date = db.Column(db.Date, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    order = db.Column(db.Integer, default=0)
+    order = db.Column(db.Integer, default=0)  # orden antiguo, sólo informativo
+    position = db.Column(OrderKey, nullable=True)  # clave de orden de la lista
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user = db.relationship('User', backref=db.backref('goals', lazy=True))
 
+    @property
+    def category_name(self):
+        return self.category.name if self.category else None
+
     def __repr__(self):
         return f"<Goal {self.description[:20]} {'(done)' if self.completed else ''}>"
 
@@ -60,6 +122,13 @@ class Goal(db.Model):
 # TAREAS
 # =======================
 class Task(db.Model):
+    __table_args__ = (
+        db.Index('ix_task_user_id_start', 'user_id', 'start'),
+        db.Index('ix_task_user_id_completed', 'user_id', 'completed'),
+        db.Index('ix_task_user_id_end_effective_start', 'user_id', 'end_effective', 'start'),
+        db.Index('ix_task_user_id_change_seq', 'user_id', 'change_seq'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
 
@@ -76,6 +145,9 @@ class Task(db.Model):
     # Fechas
     start = db.Column(db.Date, nullable=False)
     end = db.Column(db.Date, nullable=True)
+    # Último día que ocupa la tarea (se mantiene al guardar): end, o start si
+    # no tiene fin, o date.max si se repite. Permite filtrar por solapamiento.
+    end_effective = db.Column(db.Date, nullable=True)
 
     # Datos de control
     priority = db.Column(db.Integer, default=2)  # 1=Alta, 2=Media, 3=Baja
@@ -85,26 +157,31 @@ class Task(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     user = db.relationship('User', backref=db.backref('tasks', lazy=True))
 
+    # Sincronización incremental (ver app/utils/sync.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     @property
     def due_date(self):
         return self.start
 
+    def compute_end_effective(self):
+        if self.rrule_text and self.rrule_text.strip():
+            return date.max
+        return self.end or self.start
+
     def __repr__(self):
         return f"<Task {self.title}>"
 
     def to_fullcalendar(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "start": self.start.strftime('%Y-%m-%d'),
-            "end": self.end.strftime('%Y-%m-%d') if self.end else None,
-            "priority": self.priority,
-            "tag": self.tag,
-            "tag_color": self.tag_color,
-            "completed": self.completed,
-            "rrule_text": self.rrule_text,
-            "subtasks": self.subtasks or []
-        }
+        from app.utils.serializers import serialize
+        return serialize(self)
+
+
+@event.listens_for(Task, 'before_insert')
+@event.listens_for(Task, 'before_update')
+def _set_task_end_effective(mapper, connection, target):
+    target.end_effective = target.compute_end_effective()
 
 
 # =======================
@@ -112,6 +189,9 @@ class Task(db.Model):
 # =======================
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_user_id_start', 'user_id', 'start'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -141,28 +221,25 @@ class Event(db.Model):
         return f"<Event {self.title} - {self.start}>"
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "start": self.start.isoformat(),
-            "end": self.end.isoformat() if self.end else None,
-            "priority": self.priority,
-            "status": self.status,
-            "tag": self.tag,
-            "tag_color": self.tag_color,
-            "recurrence_rule": self.recurrence_rule
-        }
+        from app.utils.serializers import serialize
+        return serialize(self)
 
 
 # =======================
 # SUBTAREAS (relación 1:N con Task)
 # =======================
 class Subtask(db.Model):
+    __table_args__ = (
+        db.Index('ix_subtask_task_id', 'task_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False)
     text = db.Column(db.String(250), nullable=False)
     done = db.Column(db.Boolean, default=False)
     order = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     task = db.relationship('Task', backref=db.backref('subtasks_rel', lazy='dynamic', cascade='all, delete-orphan'))
 
@@ -178,12 +255,36 @@ class Subtask(db.Model):
             "order": self.order
         }
 
+# =======================
+# LÁPIDAS DE SINCRONIZACIÓN (tareas y subtareas borradas)
+# =======================
+class TaskTombstone(db.Model):
+    __tablename__ = 'task_tombstones'
+    __table_args__ = (
+        db.Index('ix_task_tombstones_user_id_change_seq', 'user_id', 'change_seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_task_tombstones_user_id'), nullable=False)
+    entity = db.Column(db.String(10), nullable=False)  # task / subtask
+    entity_id = db.Column(db.Integer, nullable=False)
+    task_id = db.Column(db.Integer, nullable=True)      # tarea padre si es subtarea
+    change_seq = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TaskTombstone {self.entity} {self.entity_id}>"
+
 # =======================
 # CALENDARIO 
 # =======================
 
 class ScheduleTask(db.Model):
     __tablename__ = 'schedule_tasks'
+    __table_args__ = (
+        db.Index('ix_schedule_tasks_user_id_date', 'user_id', 'date'),
+        db.Index('ix_schedule_tasks_user_id_recurrence_end_date', 'user_id', 'recurrence', 'end_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_scheduletasks_user_id'), nullable=False)
@@ -194,7 +295,7 @@ class ScheduleTask(db.Model):
 
     # Fecha y horario
     date = db.Column(db.Date, nullable=False)            # Día de la tarea
-    end_date = db.Column(db.Date, nullable=True)         # <-- NUEVO: fecha fin para recurrencia
+    end_date = db.Column(db.Date, nullable=True)         # Fin de la recurrencia (nulo = sin fin)
     start_hour = db.Column(db.Float, nullable=False)     # Ej: 9.5 = 09:30
     duration = db.Column(db.Float, nullable=False)       # Horas decimales
 
@@ -212,22 +313,14 @@ class ScheduleTask(db.Model):
     )
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "description": self.description,
-            "date": self.date.isoformat(),
-            "endDate": self.end_date.isoformat() if self.end_date else None,  # <-- incluir end_date
-            "startHour": self.start_hour,
-            "duration": self.duration,
-            "completed": self.completed,
-            "inProgress": self.in_progress,
-            "color": self.color,
-            "recurrence": self.recurrence
-        }
+        from app.utils.serializers import serialize
+        return serialize(self)
 
 class Template(db.Model):
     __tablename__ = 'templates'
+    __table_args__ = (
+        db.Index('ix_templates_user_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_templates_user_id'), nullable=False)
@@ -244,14 +337,8 @@ class Template(db.Model):
     )
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "description": self.description,
-            "duration": self.duration,
-            "color": self.color,
-            "recurrence": self.recurrence
-        }
+        from app.utils.serializers import serialize
+        return serialize(self)
 
 
 
@@ -261,6 +348,9 @@ class Template(db.Model):
 
 class PasswordEntry(db.Model):
     __tablename__ = 'password_entries'
+    __table_args__ = (
+        db.Index('ix_password_entries_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(150), nullable=False)  # Nombre o sitio web
@@ -273,9 +363,16 @@ class PasswordEntry(db.Model):
 
 class DiarioTema(db.Model):
     __tablename__ = 'diario_temas'
+    __table_args__ = (
+        db.Index('ix_diario_temas_user_id_position', 'user_id', 'position'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    position = db.Column(OrderKey, nullable=True)  # orden entre los temas del usuario
+    # Versión por elemento: cada UPDATE la incrementa y comprueba (concurrencia optimista)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -285,8 +382,14 @@ class DiarioTema(db.Model):
 
 class DiarioCategoria(db.Model):
     __tablename__ = 'diario_categorias'
+    __table_args__ = (
+        db.Index('ix_diario_categorias_tema_id_position', 'tema_id', 'position'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(150), nullable=False)
+    position = db.Column(OrderKey, nullable=True)  # orden dentro del tema
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
 
     tema_id = db.Column(db.Integer, db.ForeignKey('diario_temas.id'), nullable=False)
     tema = db.relationship('DiarioTema', back_populates='categorias')
@@ -298,8 +401,14 @@ class DiarioCategoria(db.Model):
 
 class DiarioSubcategoria(db.Model):
     __tablename__ = 'diario_subcategorias'
+    __table_args__ = (
+        db.Index('ix_diario_subcategorias_categoria_id_position', 'categoria_id', 'position'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(150), nullable=False)
+    position = db.Column(OrderKey, nullable=True)  # orden dentro de la categoría
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
 
     categoria_id = db.Column(db.Integer, db.ForeignKey('diario_categorias.id'), nullable=False)
     categoria = db.relationship('DiarioCategoria', back_populates='subcategorias')
@@ -309,9 +418,21 @@ class DiarioSubcategoria(db.Model):
 
 class DiarioApartado(db.Model):
     __tablename__ = 'diario_apartados'
+    __table_args__ = (
+        db.Index('ix_diario_apartados_user_id_position', 'user_id', 'position'),
+        db.Index('ix_diario_apartados_tema_id', 'tema_id'),
+        db.Index('ix_diario_apartados_categoria_id', 'categoria_id'),
+        db.Index('ix_diario_apartados_subcategoria_id', 'subcategoria_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     contenido = db.Column(db.Text, nullable=False)
+    # Precalculados al escribir `contenido`: los listados no leen el texto
+    titulo = db.Column(db.String(50), nullable=False, server_default='')
+    extracto = db.Column(db.String(200), nullable=False, server_default='')
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    position = db.Column(OrderKey, nullable=True)  # orden entre las notas del usuario
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
 
     tema_id = db.Column(db.Integer, db.ForeignKey('diario_temas.id'), nullable=True)
     categoria_id = db.Column(db.Integer, db.ForeignKey('diario_categorias.id'), nullable=True)  # Añadido
@@ -322,3 +443,34 @@ class DiarioApartado(db.Model):
     subcategoria = db.relationship('DiarioSubcategoria', back_populates='apartados')
 
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    @staticmethod
+    def resumen(contenido):
+        """(título, extracto): primera línea y principio del texto."""
+        texto = contenido or ''
+        return texto.split('\n', 1)[0][:50], texto[:200]
+
+
+@event.listens_for(DiarioApartado, 'before_insert')
+@event.listens_for(DiarioApartado, 'before_update')
+def _set_apartado_resumen(mapper, connection, target):
+    if inspect(target).attrs.contenido.history.has_changes():
+        target.titulo, target.extracto = DiarioApartado.resumen(target.contenido)
+
+
+# =======================
+# BÚSQUEDA (ver app/utils/search.py)
+# =======================
+class SearchDocument(db.Model):
+    """Texto indexado de un elemento buscable; el índice de texto depende del motor."""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'entity_id', name='uq_search_documents_kind_entity_id'),
+        db.Index('ix_search_documents_user_id', 'user_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_search_documents_user_id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # nota, meta, tarea, horario
+    entity_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(250), nullable=False, default='')
+    body = db.Column(db.Text, nullable=False, default='')
@@ -1,13 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models import User, db
+from app.models import User, UserStats, db
 from app import login_manager
+from app.utils.hashing import HashingBusy
+from app.utils.identity import cache_principal, load_principal
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_principal(int(user_id))
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -20,8 +22,21 @@ def login():
         remember = bool(request.form.get('remember'))
 
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
-            login_user(user, remember=remember)
+        try:
+            valida = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash('Hay demasiados inicios de sesión en curso. Inténtalo de nuevo en unos segundos.', 'danger')
+            return render_template('login.html'), 503
+        if valida and user.password_needs_rehash():
+            # Parámetros de hash cambiados en la configuración: se rehace con la contraseña en claro.
+            # Si el pool está lleno se deja para el siguiente inicio de sesión
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except HashingBusy:
+                pass
+        if valida:
+            login_user(cache_principal(user), remember=remember)
             next_page = request.args.get('next')
             # Validar que next sea un path interno para evitar redirecciones externas
             if next_page and next_page.startswith('/'):
@@ -57,8 +72,14 @@ def register():
             return redirect(url_for('auth.register'))
 
         new_user = User(username=username)
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except HashingBusy:
+            flash('El servidor está ocupado. Inténtalo de nuevo en unos segundos.', 'danger')
+            return render_template('register.html'), 503
         db.session.add(new_user)
+        db.session.flush()
+        db.session.add(UserStats(user_id=new_user.id))
         db.session.commit()
         flash('Registro correcto. Ya puedes iniciar sesión.', 'success')
         return redirect(url_for('auth.login'))
@@ -1,11 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.models import db, Category, Goal
+from app.utils.etags import conditional
 
 categories_bp = Blueprint('categories_api', __name__, url_prefix='/api/categories')
 
 @categories_bp.route('', methods=['GET'])
 @login_required
+@conditional('categories')
 def get_categories():
     categories = Category.query.filter_by(user_id=current_user.id).all()
     data = [{'id': c.id, 'name': c.name} for c in categories]
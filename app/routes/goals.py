@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime
+from sqlalchemy import update
 from app.models import db, Goal, Category
+from app.utils.etags import conditional, touch
+from app.utils.serializers import GOAL
+from app.utils.ordering import apply_orders, key_between, next_key, rebalance_if_needed, reposition
 
 goals_bp = Blueprint('goals_api', __name__, url_prefix='/api/goals')
 
@@ -17,21 +21,15 @@ def parse_date(date_str):
 
 @goals_bp.route('', methods=['GET'])
 @login_required
+@conditional('goals')
 def get_goals():
-    goals = Goal.query.filter_by(user_id=current_user.id).order_by(Goal.order.asc(), Goal.created_at.desc()).all()
-    goals_data = []
-    for g in goals:
-        goals_data.append({
-            'id': g.id,
-            'description': g.description,
-            'category_id': g.category_id,
-            'category_name': g.category.name if g.category else None,
-            'completed': g.completed,
-            'created_at': g.created_at.isoformat(),
-            'due_date': g.due_date.isoformat() if g.due_date else None,
-            'order': g.order,
-        })
-    return jsonify(goals_data)
+    goals = (
+        db.session.query(*GOAL.columns())
+        .outerjoin(Category, Goal.category_id == Category.id)
+        .filter(Goal.user_id == current_user.id)
+        .order_by(Goal.position.asc(), Goal.created_at.desc())
+    )
+    return jsonify(GOAL.many(goals))
 
 
 @goals_bp.route('', methods=['POST'])
@@ -51,7 +49,8 @@ def create_goal():
     if not category:
         category = Category.query.filter_by(user_id=current_user.id).first()
 
-    last_order = db.session.query(db.func.max(Goal.order)).filter_by(user_id=current_user.id).scalar() or 0
+    # Al final de la lista: una clave mayor que la última (máximo por índice)
+    position = next_key(Goal, Goal.user_id == current_user.id)
     new_goal = Goal(
         description=description,
         category_id=category.id if category else None,
@@ -59,22 +58,13 @@ def create_goal():
         completed=False,
         created_at=datetime.utcnow(),
         due_date=due_date,
-        order=last_order + 1
+        position=position
     )
 
     db.session.add(new_goal)
     db.session.commit()
 
-    return jsonify({
-        'id': new_goal.id,
-        'description': new_goal.description,
-        'category_id': new_goal.category_id,
-        'category_name': new_goal.category.name if new_goal.category else None,
-        'completed': new_goal.completed,
-        'created_at': new_goal.created_at.isoformat(),
-        'due_date': new_goal.due_date.isoformat() if new_goal.due_date else None,
-        'order': new_goal.order,
-    }), 201
+    return jsonify(GOAL(new_goal)), 201
 
 
 
@@ -115,16 +105,7 @@ def update_goal(goal_id):
 
     db.session.commit()
 
-    return jsonify({
-        'id': goal.id,
-        'description': goal.description,
-        'category_id': goal.category_id,
-        'category_name': goal.category.name if goal.category else None,
-        'completed': goal.completed,
-        'created_at': goal.created_at.isoformat(),
-        'due_date': goal.due_date.isoformat() if goal.due_date else None,
-        'order': goal.order,
-    })
+    return jsonify(GOAL(goal))
 
 
 @goals_bp.route('/<int:goal_id>', methods=['DELETE'])
@@ -156,14 +137,60 @@ def reorder_goals():
     data = request.get_json()
     if not isinstance(data, list):
         return jsonify({'error': 'Datos inválidos, se esperaba lista'}), 400
+
+    # Lista completa en el nuevo orden (compatibilidad): sólo se reescriben
+    # las metas que quedan fuera de su orden relativo, normalmente una
+    ids = []
     for item in data:
-        goal_id = item.get('id')
-        order = item.get('order')
-        if goal_id is None or order is None:
+        try:
+            ids.append(int(item['id']))
+        except (KeyError, TypeError, ValueError):
             continue
-        goal = Goal.query.filter_by(id=goal_id, user_id=current_user.id).first()
-        if goal:
-            goal.order = order
+    keys = dict(
+        db.session.query(Goal.id, Goal.position)
+        .filter(Goal.user_id == current_user.id, Goal.id.in_(ids))
+    )
+    changes = reposition(ids, keys)
+    apply_orders(Goal, changes, Goal.user_id == current_user.id, column='position')
+    for key in changes.values():
+        if rebalance_if_needed(Goal, key, Goal.user_id == current_user.id, order_by=(Goal.created_at.desc(),)):
+            break
+    if changes:
+        touch(current_user.id, 'goals')
     db.session.commit()
-    return jsonify({'message': 'Orden actualizado'}), 200
+    return jsonify({'message': 'Orden actualizado', 'updated': len(changes)}), 200
+
+
+@goals_bp.route('/<int:goal_id>/move', methods=['POST'])
+@login_required
+def move_goal(goal_id):
+    """
+    Coloca una meta entre dos vecinas: {"after": id | null, "before": id | null}.
+    Calcula una clave entre las de las vecinas y escribe sólo esa fila.
+    """
+    data = request.get_json() or {}
+    after_id, before_id = data.get('after'), data.get('before')
+    wanted = {goal_id} | {i for i in (after_id, before_id) if i is not None}
+    keys = dict(
+        db.session.query(Goal.id, Goal.position)
+        .filter(Goal.user_id == current_user.id, Goal.id.in_(wanted))
+    )
+    if goal_id not in keys:
+        return jsonify({'error': 'Meta no encontrada'}), 404
+    if len(keys) != len(wanted):
+        return jsonify({'error': 'Vecina no encontrada'}), 404
 
+    try:
+        position = key_between(keys.get(after_id), keys.get(before_id))
+    except ValueError:
+        return jsonify({'error': 'Las vecinas no están en orden'}), 409
+
+    db.session.execute(
+        update(Goal).where(Goal.id == goal_id).values(position=position)
+        .execution_options(synchronize_session=False)
+    )
+    if rebalance_if_needed(Goal, position, Goal.user_id == current_user.id, order_by=(Goal.created_at.desc(),)):
+        position = db.session.query(Goal.position).filter(Goal.id == goal_id).scalar()
+    touch(current_user.id, 'goals')
+    db.session.commit()
+    return jsonify({'id': goal_id, 'position': position}), 200
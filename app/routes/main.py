@@ -4,8 +4,19 @@ from collections import defaultdict
 from datetime import datetime
 
 from sqlalchemy import and_
+from sqlalchemy.orm.exc import StaleDataError
 from app.models import Goal, Category, Task, Event  # ⬅️ Importar Event
 from app.utils.tips import get_random_tip
+from app.utils.counters import get_counters, build_notificaciones
+from app.utils.stats import get_user_stats
+from app.utils.ordering import MAX_KEY_LENGTH, append_key, apply_orders, rebalance, reposition
+from app.utils.diario import (
+    DIARIO_LISTAS, PAGINA_NOTAS, PAGINA_NOTAS_MAX, DiarioPatchError, apply_patch, diario_propios,
+    lugar, notas_query, pagina_notas, resumen,
+)
+from app.utils import search
+from app.utils.etags import conditional, touch
+from app.utils.streaming import filas, stream_json
 
 from flask import request, jsonify, redirect, url_for, flash
 import string, random
@@ -39,35 +50,18 @@ def home():
 
     consejo = get_random_tip()
 
-    # 📌 Tareas
-    total_tareas = Task.query.filter_by(user_id=current_user.id).count()
-    tareas_pendientes = Task.query.filter_by(user_id=current_user.id, completed=False).count()
-    tareas_completadas = total_tareas - tareas_pendientes
-
-    # 📌 Metas
-    total_metas = Goal.query.filter_by(user_id=current_user.id).count()
-    metas_alcanzadas = Goal.query.filter_by(user_id=current_user.id, completed=True).count()
+    # 📌 Tareas, metas y eventos (una sola consulta, memorizada por petición)
+    contadores = get_counters(current_user.id)
+    total_tareas = contadores['total_tareas']
+    tareas_pendientes = contadores['tareas_pendientes']
+    tareas_completadas = contadores['tareas_completadas']
+    total_metas = contadores['total_metas']
+    metas_alcanzadas = contadores['metas_alcanzadas']
+    proximos_eventos = contadores['proximos_eventos']
 
     tareas_info = f"{tareas_completadas}/{total_tareas}" if total_tareas > 0 else "0/0"
     metas_info = f"{metas_alcanzadas}/{total_metas}" if total_metas > 0 else "0/0"
 
-    # 📌 Próximos eventos
-    proximos_eventos = Event.query.filter(
-        Event.user_id == current_user.id,
-        Event.start >= datetime.utcnow()
-    ).count()
-
-    # 📌 Mini-asistente de notificaciones
-    notificaciones = []
-    if tareas_pendientes > 0:
-        notificaciones.append(f"Tienes {tareas_pendientes} tarea(s) pendiente(s).")
-    if proximos_eventos > 0:
-        notificaciones.append(f"Tienes {proximos_eventos} evento(s) próximamente.")
-    if total_metas > 0 and metas_alcanzadas < total_metas:
-        notificaciones.append(f"Has completado {metas_alcanzadas}/{total_metas} metas.")
-    if not notificaciones:
-        notificaciones.append("Todo al día. ¡Buen trabajo!")
-
     return render_template(
     'home.html',
     resumen=resumen,
@@ -88,63 +82,37 @@ def home():
 @main_bp.app_context_processor
 def inject_notificaciones():
     from flask_login import current_user
-    from datetime import datetime
     if not current_user.is_authenticated:
         return dict(notificaciones_asistente=[])
-    
-    tareas_pendientes = Task.query.filter_by(user_id=current_user.id, completed=False).count()
-    proximos_eventos = Event.query.filter(Event.user_id == current_user.id, Event.start >= datetime.utcnow()).count()
-    total_metas = Goal.query.filter_by(user_id=current_user.id).count()
-    metas_alcanzadas = Goal.query.filter_by(user_id=current_user.id, completed=True).count()
-
-    notificaciones = []
-    if tareas_pendientes > 0:
-        notificaciones.append(f"Tienes {tareas_pendientes} tarea(s) pendiente(s).")
-    if proximos_eventos > 0:
-        notificaciones.append(f"Tienes {proximos_eventos} evento(s) próximamente.")
-    if total_metas > 0 and metas_alcanzadas < total_metas:
-        notificaciones.append(f"Has completado {metas_alcanzadas}/{total_metas} metas.")
-    if not notificaciones:
-        notificaciones.append("Todo al día. ¡Buen trabajo!")
-
-    return dict(notificaciones_asistente=notificaciones)
+
+    contadores = get_counters(current_user.id)
+    return dict(notificaciones_asistente=build_notificaciones(contadores))
 
 @main_bp.route('/tasks')
 @login_required
 def tasks():
-    # Obtener todas las tareas del usuario
-    user_tasks = Task.query.filter_by(user_id=current_user.id).all()
-
-    # Calcular estadísticas de tareas
-    total_tasks = len(user_tasks)
-    done_tasks = sum(1 for t in user_tasks if getattr(t, 'completed', False))
-    percent_tasks = round((done_tasks / total_tasks * 100), 2) if total_tasks > 0 else 0
-
-    # Calcular estadísticas de metas
-    user_goals = Goal.query.filter_by(user_id=current_user.id).all()
-    total_goals = len(user_goals)
-    done_goals = sum(1 for g in user_goals if g.completed)
-    percent_goals = round((done_goals / total_goals * 100), 2) if total_goals > 0 else 0
+    # Estadísticas materializadas: una sola fila por usuario
+    user_stats = get_user_stats(current_user.id)
 
     # Reunir todas las etiquetas existentes
-    all_tags = set()
-    for t in user_tasks:
-        if getattr(t, 'tag', None):
-            all_tags.add(t.tag)
+    all_tags = {
+        tag for (tag,) in
+        db.session.query(Task.tag).filter(Task.user_id == current_user.id, Task.tag.isnot(None)).distinct()
+        if tag
+    }
 
     # Diccionario de estadísticas para la plantilla
     stats = {
-        'total_tasks': total_tasks,
-        'done_tasks': done_tasks,
-        'percent_tasks': percent_tasks,
-        'total_goals': total_goals,
-        'done_goals': done_goals,
-        'percent_goals': percent_goals,
+        'total_tasks': user_stats.total_tasks,
+        'done_tasks': user_stats.done_tasks,
+        'percent_tasks': user_stats.percent_tasks,
+        'total_goals': user_stats.total_goals,
+        'done_goals': user_stats.done_goals,
+        'percent_goals': user_stats.percent_goals,
     }
 
     return render_template(
         'tasks.html',
-        tasks=user_tasks,
         stats=stats,
         all_tags=sorted(all_tags)
     )
@@ -164,7 +132,7 @@ def schedule_movil():
 @login_required
 def goals():
     # Obtener todas las metas del usuario ordenadas
-    user_goals = Goal.query.filter_by(user_id=current_user.id).order_by(Goal.order.asc(), Goal.created_at.desc()).all()
+    user_goals = Goal.query.filter_by(user_id=current_user.id).order_by(Goal.position.asc(), Goal.created_at.desc()).all()
 
     # Obtener todas las categorías del usuario
     categories = Category.query.filter_by(user_id=current_user.id).all()
@@ -311,52 +279,53 @@ def delete_password(entry_id):
 # --------------------------------------------------------------
 @main_bp.route("/api/diario", methods=["GET"])
 @login_required
+@conditional("diario")
 def api_get_diario():
     """
     Devuelve toda la estructura del diario para el usuario actual
     """
     # Obtenemos directamente las notas del usuario actual con filtro user_id
-    apartados = DiarioApartado.query.filter_by(user_id=current_user.id).all()
+    apartados = DiarioApartado.query.filter_by(user_id=current_user.id) \
+        .order_by(DiarioApartado.position, DiarioApartado.id).all()
 
-    temas = DiarioTema.query.filter_by(user_id=current_user.id).all()
+    temas = DiarioTema.query.filter_by(user_id=current_user.id) \
+        .order_by(DiarioTema.position, DiarioTema.id).all()
     categorias = (
         DiarioCategoria.query
         .join(DiarioTema)
         .filter(DiarioTema.user_id == current_user.id)
+        .order_by(DiarioCategoria.tema_id, DiarioCategoria.position, DiarioCategoria.id)
         .all()
     )
     subcategorias = (
         DiarioSubcategoria.query
         .join(DiarioCategoria).join(DiarioTema)
         .filter(DiarioTema.user_id == current_user.id)
+        .order_by(DiarioSubcategoria.categoria_id, DiarioSubcategoria.position, DiarioSubcategoria.id)
         .all()
     )
 
     data = {
         "temas": [
-            {"id": t.id, "name": t.titulo, "createdAt": t.fecha_creacion.isoformat()}
+            {"id": t.id, "name": t.titulo, "createdAt": t.fecha_creacion.isoformat(), "version": t.version}
             for t in temas
         ],
         "categorias": [
-            {"id": c.id, "name": c.nombre, "temaId": c.tema_id}
+            {"id": c.id, "name": c.nombre, "temaId": c.tema_id, "version": c.version}
             for c in categorias
         ],
         "subcategorias": [
-            {"id": s.id, "name": s.nombre, "categoriaId": s.categoria_id}
+            {"id": s.id, "name": s.nombre, "categoriaId": s.categoria_id, "version": s.version}
             for s in subcategorias
         ],
         "notas": [
             {
                 "id": a.id,
-                "title": (a.contenido.split("\n")[0][:50]) if a.contenido else "",
+                "title": a.titulo,
                 "content": a.contenido,
                 "createdAt": a.fecha_creacion.isoformat(),
-                "place": (
-                    f"tema:{a.tema_id}" if a.tema_id else
-                    f"categoria:{a.categoria_id}" if a.categoria_id else
-                    f"subcategoria:{a.subcategoria_id}" if a.subcategoria_id else
-                    "root"
-                ),
+                "version": a.version,
+                "place": lugar(a),
                 "tags": []  # Aquí puedes mapear etiquetas si las manejas
             }
             for a in apartados
@@ -365,6 +334,83 @@ def api_get_diario():
     return jsonify(data)
 
 
+# --------------------------------------------------------------
+# 📌 API: Árbol del diario (estructura + títulos de notas)
+# --------------------------------------------------------------
+@main_bp.route("/api/diario/tree", methods=["GET"])
+@login_required
+@conditional("diario")
+def api_get_diario_tree():
+    """
+    Igual que GET /api/diario pero sin el texto de las notas (sólo id,
+    título, lugar y versión). Se envía por trozos mientras se leen las filas.
+    """
+    user_id = current_user.id
+    temas = diario_propios(user_id, "tema", DiarioTema.id, DiarioTema.titulo, DiarioTema.fecha_creacion,
+                           DiarioTema.version).order_by(DiarioTema.position, DiarioTema.id)
+    categorias = diario_propios(user_id, "categoria", DiarioCategoria.id, DiarioCategoria.nombre,
+                                DiarioCategoria.tema_id, DiarioCategoria.version) \
+        .order_by(DiarioCategoria.tema_id, DiarioCategoria.position, DiarioCategoria.id)
+    subcategorias = diario_propios(user_id, "subcategoria", DiarioSubcategoria.id, DiarioSubcategoria.nombre,
+                                   DiarioSubcategoria.categoria_id, DiarioSubcategoria.version) \
+        .order_by(DiarioSubcategoria.categoria_id, DiarioSubcategoria.position, DiarioSubcategoria.id)
+
+    return stream_json({
+        "temas": (
+            {"id": t.id, "name": t.titulo, "createdAt": t.fecha_creacion.isoformat(), "version": t.version}
+            for t in filas(temas)
+        ),
+        "categorias": (
+            {"id": c.id, "name": c.nombre, "temaId": c.tema_id, "version": c.version}
+            for c in filas(categorias)
+        ),
+        "subcategorias": (
+            {"id": s.id, "name": s.nombre, "categoriaId": s.categoria_id, "version": s.version}
+            for s in filas(subcategorias)
+        ),
+        "notas": (resumen(a) for a in filas(notas_query(user_id))),
+    })
+
+
+# --------------------------------------------------------------
+# 📌 API: Notas de un lugar, paginadas (con extracto)
+# --------------------------------------------------------------
+@main_bp.route("/api/diario/notas", methods=["GET"])
+@login_required
+@conditional("diario")
+def api_get_diario_notas():
+    """
+    ?place=all|root|tema:<id>|categoria:<id>|subcategoria:<id>
+    &after=<cursor>&limit=<n>. Devuelve {"notas": [...], "next": cursor | null}.
+    """
+    limit = request.args.get("limit", PAGINA_NOTAS, type=int)
+    limit = max(1, min(limit, PAGINA_NOTAS_MAX))
+    try:
+        notas, siguiente = pagina_notas(
+            current_user.id, request.args.get("place", "all"), request.args.get("after"), limit
+        )
+    except DiarioPatchError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"notas": notas, "next": siguiente})
+
+
+# --------------------------------------------------------------
+# 📌 API: Texto completo de una nota
+# --------------------------------------------------------------
+@main_bp.route("/api/diario/apartado/<int:item_id>", methods=["GET"])
+@login_required
+@conditional("diario")
+def api_get_diario_apartado(item_id):
+    nota = DiarioApartado.query.filter_by(id=item_id, user_id=current_user.id).first_or_404()
+    return jsonify({
+        "id": nota.id,
+        "content": nota.contenido,
+        "createdAt": nota.fecha_creacion.isoformat(),
+        "version": nota.version,
+        "place": lugar(nota),
+    })
+
+
 
 # --------------------------------------------------------------
 # 📌 API: Guardar toda la estructura del diario
@@ -373,6 +419,7 @@ def api_get_diario():
 @login_required
 def api_save_diario():
     payload = request.get_json()
+    ultimas = {}  # última clave de orden de cada lista, para añadir al final
 
     # Primero actualizar o crear temas
     tema_map = {}
@@ -387,7 +434,8 @@ def api_save_diario():
             tema = DiarioTema(
                 titulo=t["name"],
                 fecha_creacion=datetime.fromisoformat(t["createdAt"]) if "createdAt" in t else datetime.utcnow(),
-                user_id=current_user.id
+                user_id=current_user.id,
+                position=append_key(DiarioTema, DiarioTema.user_id, current_user.id, ultimas)
             )
             db.session.add(tema)
         db.session.flush()
@@ -417,7 +465,8 @@ def api_save_diario():
         else:
             categoria = DiarioCategoria(
                 nombre=c["name"],
-                tema_id=tema_id
+                tema_id=tema_id,
+                position=append_key(DiarioCategoria, DiarioCategoria.tema_id, tema_id, ultimas)
             )
             db.session.add(categoria)
         db.session.flush()
@@ -434,9 +483,11 @@ def api_save_diario():
             subcategoria.nombre = s["name"]
             subcategoria.categoria_id = cat_map.get(s.get("categoriaId"))
         else:
+            categoria_id = cat_map.get(s.get("categoriaId"))
             subcategoria = DiarioSubcategoria(
                 nombre=s["name"],
-                categoria_id=cat_map.get(s.get("categoriaId"))
+                categoria_id=categoria_id,
+                position=append_key(DiarioSubcategoria, DiarioSubcategoria.categoria_id, categoria_id, ultimas)
             )
             db.session.add(subcategoria)
         db.session.flush()
@@ -452,7 +503,10 @@ def api_save_diario():
         if "id" in n and n["id"] in existing_apartados:
             apartado = existing_apartados[n["id"]]
         else:
-            apartado = DiarioApartado(user_id=current_user.id)
+            apartado = DiarioApartado(
+                user_id=current_user.id,
+                position=append_key(DiarioApartado, DiarioApartado.user_id, current_user.id, ultimas)
+            )
             db.session.add(apartado)
 
         apartado.contenido = n.get("content", "")
@@ -484,6 +538,31 @@ def api_save_diario():
 
 
 
+# --------------------------------------------------------------
+# 📌 API: Sincronizar sólo los cambios del diario
+# --------------------------------------------------------------
+@main_bp.route("/api/diario/sync", methods=["POST"])
+@login_required
+def api_sync_diario():
+    """
+    Aplica un parche con lo creado, modificado y borrado desde la última
+    carga (formato en app/utils/diario.py) en una transacción. Devuelve
+    los ids reales de lo creado, las versiones nuevas y los conflictos.
+    """
+    try:
+        result = apply_patch(current_user.id, request.get_json(silent=True))
+    except DiarioPatchError as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except StaleDataError:
+        # Otra petición cambió alguna fila entre la lectura y la escritura
+        db.session.rollback()
+        return jsonify({"status": "conflict", "message": "El diario cambió; recarga y vuelve a intentarlo"}), 409
+
+    db.session.commit()
+    return jsonify(dict(result, status="conflict" if result["conflicts"] else "ok"))
+
+
 # --------------------------------------------------------------
 # 📌 API: Borrar elemento individual
 # --------------------------------------------------------------
@@ -550,6 +629,8 @@ def delete_subcategoria(item_id):
 def delete_all_apartados():
     try:
         count = DiarioApartado.query.filter_by(user_id=current_user.id).delete()
+        search.forget(current_user.id, "nota")
+        touch(current_user.id, "diario")
         db.session.commit()
         return jsonify({"status": "deleted", "count": count})
     except Exception as e:
@@ -562,6 +643,7 @@ def delete_all_apartados():
 def delete_all_temas():
     try:
         count = DiarioTema.query.filter_by(user_id=current_user.id).delete()
+        touch(current_user.id, "diario")
         db.session.commit()
         return jsonify({"status": "deleted", "count": count})
     except Exception as e:
@@ -574,6 +656,7 @@ def delete_all_temas():
 def delete_all_categorias():
     try:
         count = DiarioCategoria.query.join(DiarioTema).filter(DiarioTema.user_id == current_user.id).delete()
+        touch(current_user.id, "diario")
         db.session.commit()
         return jsonify({"status": "deleted", "count": count})
     except Exception as e:
@@ -587,6 +670,7 @@ def delete_all_subcategorias():
     try:
         count = DiarioSubcategoria.query.join(DiarioCategoria).join(DiarioTema) \
             .filter(DiarioTema.user_id == current_user.id).delete()
+        touch(current_user.id, "diario")
         db.session.commit()
         return jsonify({"status": "deleted", "count": count})
     except Exception as e:
@@ -646,37 +730,34 @@ def api_update_diario_item(tipo, item_id):
 @login_required
 def api_ordenar_diario_items(tipo):
     """
-    Guarda el orden de elementos según tipo.
-    El modelo debe tener un campo 'order' definido para que funcione.
+    Guarda el orden de elementos según tipo: {"orden": [id, id, ...]}.
+    Valida la propiedad de todo el lote con una consulta y escribe las
+    nuevas claves de orden con una sola sentencia; los elementos que ya
+    estaban en orden relativo conservan su clave.
     """
-    orden = request.get_json().get("orden", [])
-    modelo_map = {
-        "tema": DiarioTema,
-        "apartado": DiarioApartado,
-        "categoria": DiarioCategoria,
-        "subcategoria": DiarioSubcategoria
-    }
-    modelo = modelo_map.get(tipo)
-    if not modelo:
+    if tipo not in DIARIO_LISTAS:
         abort(400, "Tipo inválido")
+    orden = (request.get_json(silent=True) or {}).get("orden", [])
+    if not isinstance(orden, list):
+        abort(400, "Se esperaba una lista de ids")
+    modelo, grupo = DIARIO_LISTAS[tipo]
 
-    for index, item_id in enumerate(orden):
-        item = None
-        if tipo == "tema":
-            item = modelo.query.filter_by(id=item_id, user_id=current_user.id).first()
-        elif tipo == "categoria":
-            item = modelo.query.join(DiarioTema) \
-                .filter(modelo.id == item_id, DiarioTema.user_id == current_user.id).first()
-        elif tipo == "subcategoria":
-            item = modelo.query.join(DiarioCategoria).join(DiarioTema) \
-                .filter(modelo.id == item_id, DiarioTema.user_id == current_user.id).first()
-        elif tipo == "apartado":
-            item = modelo.query.join(DiarioTema, isouter=True) \
-                .filter(modelo.id == item_id, DiarioTema.user_id == current_user.id).first()
-
-        if item and hasattr(item, "order"):
-            item.order = index
-
+    ids = []
+    for item_id in orden:
+        try:
+            ids.append(int(item_id))
+        except (TypeError, ValueError):
+            continue
+    filas = diario_propios(current_user.id, tipo, modelo.id, modelo.position, grupo).filter(modelo.id.in_(ids)).all()
+
+    cambios = reposition(ids, {item_id: clave for item_id, clave, _ in filas})
+    apply_orders(modelo, cambios)
+    # Listas con claves demasiado largas: se redistribuyen enteras
+    for valor in {valor for item_id, _, valor in filas if len(cambios.get(item_id, "")) > MAX_KEY_LENGTH}:
+        rebalance(modelo, grupo == valor)
+
+    if cambios:
+        touch(current_user.id, "diario")
     db.session.commit()
-    return jsonify({"status": "ok"})
+    return jsonify({"status": "ok", "updated": len(cambios)})
 
@@ -0,0 +1,30 @@
+import hmac
+
+from flask import Blueprint, abort, current_app, jsonify, request
+from app.utils import pool
+
+metrics_bp = Blueprint('metrics_api', __name__, url_prefix='/api/metrics')
+
+
+@metrics_bp.before_request
+def require_token():
+    """
+    Sólo con METRICS_TOKEN configurado y enviado en la cabecera
+    `Authorization: Bearer <token>`; sin token configurado no existe.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    enviado = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(enviado.encode(), f"Bearer {token}".encode()):
+        abort(403)
+
+
+@metrics_bp.route('/pool', methods=['GET'])
+def pool_metrics():
+    """
+    Pool de conexiones del proceso que atiende la petición: tamaño,
+    conexiones en uso, saturación (en uso / capacidad), espera media y
+    máxima al sacar una conexión (ms), agotamientos e invalidaciones.
+    """
+    return jsonify(pool.snapshot())
@@ -3,6 +3,9 @@ from flask_login import login_required, current_user
 from datetime import datetime, timedelta, timezone
 from app import db
 from app.models import ScheduleTask, Template
+from app.utils.etags import conditional
+from app.utils.recurrence import expand_window
+from app.utils.serializers import SCHEDULE_TASK, TEMPLATE
 
 schedule_bp = Blueprint('schedule', __name__, url_prefix='/api')
 
@@ -17,6 +20,7 @@ def parse_date(date_str):
 # --- Rutas de tareas ---
 @schedule_bp.route('/week')
 @login_required
+@conditional('week')
 def get_week():
     start_str = request.args.get('start')
     start_date = parse_date(start_str)
@@ -25,54 +29,8 @@ def get_week():
 
     end_date = start_date + timedelta(days=6)
 
-    tasks = ScheduleTask.query.filter(
-        ScheduleTask.user_id == current_user.id,
-        ScheduleTask.date <= end_date  # obtén al menos las tareas cuyo start date es ≤ fin semana
-    ).all()
-
-    tasks_list = []
-    for t in tasks:
-        # Si es recurrente y tiene fecha fin definida, crear instancias expandidas para la semana
-        if t.recurrence != 'none' and t.end_date:
-            current = max(t.date, start_date)
-            final_date = min(t.end_date, end_date)
-            while current <= final_date:
-                matches = (
-                    t.recurrence == 'daily' or
-                    (t.recurrence == 'weekly' and current.weekday() == t.date.weekday()) or
-                    (t.recurrence == 'monthly' and current.day == t.date.day)
-                )
-                if matches:
-                    tasks_list.append({
-                        "id": f"{t.id}-{current.strftime('%Y%m%d')}",  # id único por ocurrencia
-                        "title": t.title,
-                        "description": t.description,
-                        "date": current.isoformat(),
-                        "startHour": t.start_hour,
-                        "duration": t.duration,
-                        "completed": t.completed,
-                        "inProgress": t.in_progress,
-                        "color": t.color,
-                        "recurrence": "none",  # ya no recurrente para cliente
-                        "endDate": t.end_date.isoformat() if t.end_date else None
-                    })
-                current += timedelta(days=1)
-        else:
-            # tarea sin recurrencia: sólo la original
-            if start_date <= t.date <= end_date:
-                tasks_list.append({
-                    "id": t.id,
-                    "title": t.title,
-                    "description": t.description,
-                    "date": t.date.isoformat(),
-                    "startHour": t.start_hour,
-                    "duration": t.duration,
-                    "completed": t.completed,
-                    "inProgress": t.in_progress,
-                    "color": t.color,
-                    "recurrence": t.recurrence,
-                    "endDate": t.end_date.isoformat() if t.end_date else None
-                })
+    # Sólo las filas que tocan la semana; las recurrentes se expanden aritméticamente
+    tasks_list = expand_window(current_user.id, start_date, end_date)
 
     return jsonify({
         "start": start_date.isoformat(),
@@ -115,19 +73,7 @@ def create_task():
     db.session.add(task)
     db.session.commit()
 
-    return jsonify({
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "date": task.date.isoformat(),
-        "endDate": task.end_date.isoformat() if task.end_date else None,
-        "startHour": task.start_hour,
-        "duration": task.duration,
-        "completed": task.completed,
-        "inProgress": task.in_progress,
-        "color": task.color,
-        "recurrence": task.recurrence
-    })
+    return jsonify(SCHEDULE_TASK(task))
 
 from flask import request, jsonify
 
@@ -191,19 +137,7 @@ def update_task(task_id):
     if 'recurrence' in data: task.recurrence = data['recurrence']
 
     db.session.commit()
-    return jsonify({
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "date": task.date.isoformat(),
-        "endDate": task.end_date.isoformat() if task.end_date else None,
-        "startHour": task.start_hour,
-        "duration": task.duration,
-        "completed": task.completed,
-        "inProgress": task.in_progress,
-        "color": task.color,
-        "recurrence": task.recurrence
-    })
+    return jsonify(SCHEDULE_TASK(task))
 
 
 @schedule_bp.route('/tasks/<int:task_id>', methods=['DELETE'])
@@ -217,21 +151,10 @@ def delete_task(task_id):
 # --- Templates ---
 @schedule_bp.route('/templates', methods=['GET'])
 @login_required
+@conditional('templates')
 def get_templates():
-    templates = Template.query.filter_by(user_id=current_user.id).all()
-    return jsonify({
-        "templates": [
-            {
-                "id": t.id,
-                "title": t.title,
-                "description": t.description,
-                "duration": t.duration,
-                "color": t.color,
-                "recurrence": t.recurrence
-            }
-            for t in templates
-        ]
-    })
+    templates = db.session.query(*TEMPLATE.columns()).filter(Template.user_id == current_user.id)
+    return jsonify({"templates": TEMPLATE.many(templates)})
 
 @schedule_bp.route('/templates', methods=['POST'])
 @login_required
@@ -251,14 +174,7 @@ def create_template():
     )
     db.session.add(tpl)
     db.session.commit()
-    return jsonify({
-        "id": tpl.id,
-        "title": tpl.title,
-        "description": tpl.description,
-        "duration": tpl.duration,
-        "color": tpl.color,
-        "recurrence": tpl.recurrence
-    })
+    return jsonify(TEMPLATE(tpl))
 
 @schedule_bp.route('/templates/<int:tpl_id>', methods=['PUT'])
 @login_required
@@ -278,14 +194,7 @@ def update_template(tpl_id):
         tpl.recurrence = data['recurrence']
 
     db.session.commit()
-    return jsonify({
-        "id": tpl.id,
-        "title": tpl.title,
-        "description": tpl.description,
-        "duration": tpl.duration,
-        "color": tpl.color,
-        "recurrence": tpl.recurrence
-    })
+    return jsonify(TEMPLATE(tpl))
 
 @schedule_bp.route('/templates/<int:tpl_id>', methods=['DELETE'])
 @login_required
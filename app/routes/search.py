@@ -0,0 +1,29 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from app.utils.search import KINDS, MAX_PAGE_SIZE, PAGE_SIZE, search
+
+search_bp = Blueprint('search_api', __name__, url_prefix='/api/search')
+
+
+@search_bp.route('', methods=['GET'])
+@login_required
+def search_all():
+    """
+    ?q=texto&kinds=nota,meta,tarea,horario&limit=20&offset=0&place=tema:3
+    Devuelve {"results": [{kind, id, title, snippet, score}], "next": offset | null}.
+    Con `place` (root, tema:id, categoria:id o subcategoria:id) sólo notas de esa ubicación.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Consulta vacía'}), 400
+
+    kinds = request.args.get('kinds')
+    kinds = [k for k in kinds.split(',') if k in KINDS] if kinds else list(KINDS)
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    try:
+        results, next_offset = search(current_user.id, q, kinds, limit, offset, request.args.get('place'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'next': next_offset})
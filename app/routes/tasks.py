@@ -1,8 +1,16 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from app import db
-from app.models import Task, Subtask
+from app.models import Task, Subtask, TaskTombstone
 from flask_login import current_user, login_required
 from datetime import datetime, date
+from collections import defaultdict
+import base64
+import binascii
+from sqlalchemy import and_, or_
+from app.utils.recurrence import RecurrenceLimitError, check_window, expand_task, has_rrule, validate_rrule
+from app.utils.etags import conditional
+from app.utils.serializers import SUBTASK, TASK
+from app.utils.sync import seq_range
 
 tasks_api = Blueprint('tasks_api', __name__)
 tasks_page = Blueprint('tasks_page', __name__)
@@ -10,26 +18,44 @@ tasks_page = Blueprint('tasks_page', __name__)
 # ---------------------------
 # SERIALIZADORES
 # ---------------------------
-def serialize_subtask(subtask):
-    return {
-        'id': subtask.id,
-        'text': subtask.text,      # 👈 mismo nombre que frontend espera
-        'done': subtask.done       # 👈 mismo nombre que frontend espera
-    }
-
-def serialize_task(task):
-    return {
-        'id': task.id,
-        'title': task.title,
-        'start': task.start.strftime('%Y-%m-%d'),
-        'end': task.end.strftime('%Y-%m-%d') if task.end else None,
-        'priority': task.priority,
-        'tag': task.tag,
-        'tagColor': task.tag_color,               # 👈 mapear tag_color → tagColor
-        'completed': task.completed,
-        'rruleText': task.rrule_text,             # 👈 mapear rrule_text → rruleText
-        'subtasks': [serialize_subtask(st) for st in task.subtasks_rel.all()]
-    }
+ALL_TASK_FIELDS = TASK.names | {'subtasks'}
+
+def serialize_task(task, subtasks=None, fields=ALL_TASK_FIELDS):
+    """
+    Serializa una tarea (objeto ORM o fila con las mismas columnas).
+    `fields` limita los campos devueltos.
+    """
+    data = TASK(task, None if fields is ALL_TASK_FIELDS else fields)
+    if 'subtasks' in fields:
+        if subtasks is None:
+            subtasks = load_subtasks([task]).get(task.id, [])
+        data['subtasks'] = SUBTASK.many(subtasks)
+    return data
+
+def serialize_tasks(tasks, fields=ALL_TASK_FIELDS):
+    """Serializa una lista de tareas cargando sus subtareas en bloque."""
+    subtasks = load_subtasks(tasks) if 'subtasks' in fields else {}
+    return [serialize_task(task, subtasks.get(task.id, []), fields) for task in tasks]
+
+# Máximo de ids por cláusula IN (SQLite limita los parámetros por consulta)
+SUBTASK_BATCH_SIZE = 500
+
+def load_subtasks(tasks):
+    """
+    Carga las subtareas de todas las tareas indicadas con una consulta
+    por bloque de ids (en vez de una por tarea) y las agrupa por task_id.
+    """
+    task_ids = [task.id for task in tasks if task.id is not None]
+    grouped = defaultdict(list)
+    for i in range(0, len(task_ids), SUBTASK_BATCH_SIZE):
+        rows = (
+            db.session.query(Subtask.id, Subtask.task_id, Subtask.text, Subtask.done)
+            .filter(Subtask.task_id.in_(task_ids[i:i + SUBTASK_BATCH_SIZE]))
+            .order_by(Subtask.task_id, Subtask.id)
+        )
+        for row in rows:
+            grouped[row.task_id].append(row)
+    return grouped
 
 # ---------------------------
 # RUTA HTML
@@ -64,85 +90,274 @@ def tasks_view():
 # ---------------------------
 # API - LISTAR EVENTOS
 # ---------------------------
+# Paginación por cursor
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(task):
+    return base64.urlsafe_b64encode(f"{task.start.isoformat()}|{task.id}".encode()).decode()
+
+def decode_cursor(cursor):
+    start_str, id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return date.fromisoformat(start_str), int(id_str)
+
 @tasks_api.route('/api/events', methods=['GET'])
 @login_required
+@conditional('events')
 def get_events():
+    """
+    Lista las tareas del usuario.
+
+    - start/end: sólo las que se solapan con el rango
+    - expand=1: con rango, devuelve cada ocurrencia de las tareas con RRULE
+    - fields=id,title,...: sólo esos campos (y sólo esas columnas en la consulta);
+      al expandir también se puede pedir `occurrence`
+    - limit/cursor: paginación por (start, id); la respuesta pasa a ser
+      {"items": [...], "nextCursor": ...}
+    """
     start_str = request.args.get('start')
     end_str = request.args.get('end')
+    expand = request.args.get('expand') in ('1', 'true')
 
-    query = Task.query.filter_by(user_id=current_user.id)
+    fields = ALL_TASK_FIELDS
+    if request.args.get('fields'):
+        fields = frozenset(f.strip() for f in request.args['fields'].split(',') if f.strip())
+        unknown = fields - ALL_TASK_FIELDS - {'occurrence'}
+        if unknown:
+            return jsonify({"error": f"Campos desconocidos: {', '.join(sorted(unknown))}"}), 400
 
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "limit inválido"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit inválido"}), 400
+
+    # Columnas: las pedidas más las necesarias para cursor y expansión
+    columns = [Task.id, Task.start] + TASK.columns(fields & TASK.names)
+    if expand:
+        columns += [Task.end, Task.rrule_text]
+    columns = list({column.key: column for column in columns}.values())
+    query = db.session.query(*columns).filter(Task.user_id == current_user.id)
+
+    start = end = None
     if start_str and end_str:
         try:
             start = datetime.fromisoformat(start_str.replace('Z', '')).date()
             end = datetime.fromisoformat(end_str.replace('Z', '')).date()
-            query = query.filter(Task.start >= start, Task.start <= end)
         except Exception:
             return jsonify({"error": "Formato de fecha inválido"}), 400
-
-    tasks = query.all()
-    return jsonify([serialize_task(task) for task in tasks])
+        if expand:
+            try:
+                check_window(start, end)
+            except RecurrenceLimitError as e:
+                return jsonify({"error": str(e)}), 400
+        # Solapamiento de intervalos: también las tareas de varios días que
+        # empezaron antes del rango y las recurrentes (end_effective = date.max)
+        query = query.filter(Task.start <= end, Task.end_effective >= start)
+
+    next_cursor = None
+    if paginated:
+        if request.args.get('cursor'):
+            try:
+                cursor_start, cursor_id = decode_cursor(request.args['cursor'])
+            except (ValueError, UnicodeDecodeError, binascii.Error):
+                return jsonify({"error": "Cursor inválido"}), 400
+            query = query.filter(or_(
+                Task.start > cursor_start,
+                and_(Task.start == cursor_start, Task.id > cursor_id),
+            ))
+        tasks = query.order_by(Task.start, Task.id).limit(limit + 1).all()
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor(tasks[-1])
+    else:
+        tasks = query.all()
+
+    serialized = serialize_tasks(tasks, fields)
+    if expand and start:
+        result = []
+        try:
+            for task, data in zip(tasks, serialized):
+                if has_rrule(task):
+                    result.extend(expand_task(data, task, start, end,
+                                              None if fields is ALL_TASK_FIELDS else fields))
+                else:
+                    result.append(data)
+        except RecurrenceLimitError as e:
+            return jsonify({"error": str(e)}), 400
+        serialized = result
+
+    if paginated:
+        return jsonify({"items": serialized, "nextCursor": next_cursor})
+    return jsonify(serialized)
 
 # ---------------------------
-# API - CREAR EVENTO
+# API - CAMBIOS DESDE UN TOKEN (sincronización incremental)
 # ---------------------------
-@tasks_api.route('/api/events', methods=['POST'])
+@tasks_api.route('/api/events/changes', methods=['GET'])
 @login_required
-def create_event():
-    data = request.get_json() or {}
+def get_event_changes():
+    """
+    Devuelve lo que cambió desde `since` (el token de la respuesta anterior):
+    tareas nuevas o modificadas, con sus subtareas, e ids borrados.
+    Sin `since` (o con un token que ya no es válido, p. ej. anterior a
+    las lápidas purgadas) devuelve todas las tareas con "full": true
+    para que el cliente reemplace su copia.
+    """
+    # El token se lee antes que los datos: un cambio concurrente tendrá
+    # una secuencia mayor y llegará en la siguiente petición
+    oldest, token = seq_range(current_user.id)
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"error": "Token inválido"}), 400
+
+    full = since <= 0 or since > token or since < oldest
+    query = Task.query.filter(Task.user_id == current_user.id)
+    deleted, deleted_subtasks = [], []
+    if not full:
+        query = query.filter(Task.change_seq > since)
+        tombstones = db.session.query(TaskTombstone.entity, TaskTombstone.entity_id).filter(
+            TaskTombstone.user_id == current_user.id,
+            TaskTombstone.change_seq > since,
+        )
+        for entity, entity_id in tombstones:
+            (deleted if entity == 'task' else deleted_subtasks).append(entity_id)
 
-    # --- Validaciones básicas ---
-    title = data.get('title')
-    start_str = data.get('start')
-    end_str = data.get('end')
+    return jsonify({
+        "token": str(token),
+        "full": full,
+        "tasks": serialize_tasks(query.order_by(Task.id).all()),
+        "deleted": deleted,
+        "deletedSubtasks": deleted_subtasks,
+    })
 
-    if not title:
-        return jsonify({"error": "El título es obligatorio"}), 400
-    if not start_str:
-        return jsonify({"error": "La fecha de inicio es obligatoria"}), 400
+# ---------------------------
+# VALIDACIÓN DE PAYLOADS (compartida por las rutas individuales y el lote)
+# ---------------------------
+class TaskPayloadError(ValueError):
+    """Payload de tarea no válido; el mensaje se devuelve al cliente."""
 
+def _parse_date(value, error):
+    if not value:
+        return None
     try:
-        start = datetime.strptime(start_str, '%Y-%m-%d').date()
-    except ValueError:
-        return jsonify({"error": "Formato de fecha de inicio inválido"}), 400
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise TaskPayloadError(error)
+
+def task_changes(data, task=None):
+    """
+    Valida el payload de una tarea y devuelve los atributos a asignar,
+    sin tocar la tarea. Sin `task` se valida una creación.
+    """
+    if not isinstance(data, dict):
+        raise TaskPayloadError("Datos de tarea inválidos")
+    if task is None and not data.get('title'):
+        raise TaskPayloadError("El título es obligatorio")
+
+    changes = {}
+    if 'title' in data:
+        changes['title'] = data['title']
+    if 'start' in data or task is None:
+        changes['start'] = _parse_date(data.get('start'), "Formato de fecha de inicio inválido")
+        if changes['start'] is None:
+            raise TaskPayloadError("La fecha de inicio es obligatoria")
+    if 'end' in data:
+        changes['end'] = _parse_date(data['end'], "Formato de fecha de fin inválido")
+
+    start = changes.get('start', task.start if task else None)
+    end = changes.get('end', task.end if task else None)
+    if start and end and end < start:
+        raise TaskPayloadError("La fecha de fin no puede ser anterior a la de inicio")
 
-    end = None
-    if end_str:
+    if 'priority' in data:
+        try:
+            changes['priority'] = int(data['priority'])
+        except (TypeError, ValueError):
+            raise TaskPayloadError("Prioridad inválida")
+    if 'tag' in data:
+        changes['tag'] = data['tag']
+    if 'tagColor' in data:
+        changes['tag_color'] = data['tagColor']         # 💡 color etiqueta
+    if 'completed' in data:
+        changes['completed'] = bool(data['completed'])
+    if 'rruleText' in data:
         try:
-            end = datetime.strptime(end_str, '%Y-%m-%d').date()
-        except ValueError:
-            return jsonify({"error": "Formato de fecha de fin inválido"}), 400
-
-    if end and end < start:
-        return jsonify({"error": "La fecha de fin no puede ser anterior a la de inicio"}), 400
-
-    # --- Crear la tarea ---
-    task = Task(
-        title=title,
-        start=start,
-        end=end,
-        priority=int(data.get('priority', 2)),
-        tag=data.get('tag'),
-        tag_color=data.get('tagColor'),        # 💡 nuevo: color etiqueta
-        completed=bool(data.get('completed', False)),
-        rrule_text=data.get('rruleText'),      # 💡 nuevo: recurrencia
-        user_id=current_user.id
-    )
+            validate_rrule(data['rruleText'])
+        except ValueError as e:
+            raise TaskPayloadError(str(e))
+        changes['rrule_text'] = data['rruleText']       # 💡 recurrencia
+
+    subtasks = data.get('subtasks')
+    if isinstance(subtasks, list) and not all(isinstance(st, dict) for st in subtasks):
+        raise TaskPayloadError("Subtareas inválidas")
+    return changes
+
+def new_task(data, user_id):
+    """Crea (sin añadir a la sesión) una tarea a partir de un payload válido."""
+    changes = task_changes(data)
+    task = Task(priority=2, completed=False, user_id=user_id)
+    for attr, value in changes.items():
+        setattr(task, attr, value)
+    apply_subtasks(task, data.get('subtasks'), {})
+    return task
+
+def apply_subtasks(task, items, current):
+    """
+    Sincroniza las subtareas con la lista del payload: edita las que
+    traen un id existente, crea las nuevas y borra las que no vienen.
+    `current` son las subtareas actuales de la tarea por id.
+    """
+    if not isinstance(items, list):
+        return
+    handled_ids = set()
+    for st_data in items:
+        st_id = st_data.get('id')
+        st_text = st_data.get('text', '')
+        st_done = st_data.get('done', False)
+
+        if st_id and st_id in current:
+            # Editar subtarea existente
+            sub = current[st_id]
+            sub.text = st_text
+            sub.done = st_done
+            handled_ids.add(st_id)
+        else:
+            # Crear subtarea nueva (vinculada por relación: la tarea puede no tener id aún)
+            db.session.add(Subtask(task=task, text=st_text, done=st_done))
+
+    # Eliminar las subtareas que ya no vienen
+    for st_id, st in current.items():
+        if st_id not in handled_ids:
+            db.session.delete(st)
+
+def update_task(task, data, current_subtasks=None):
+    """Valida y aplica un payload de edición sobre una tarea existente."""
+    changes = task_changes(data, task)
+    for attr, value in changes.items():
+        setattr(task, attr, value)
+    if isinstance(data.get('subtasks'), list):
+        if current_subtasks is None:
+            current_subtasks = {st.id: st for st in task.subtasks_rel.all()}
+        apply_subtasks(task, data['subtasks'], current_subtasks)
 
-    db.session.add(task)
-    db.session.commit()  # commit para que tenga ID
-
-    # --- Crear subtareas si vienen en el payload ---
-    if 'subtasks' in data and isinstance(data['subtasks'], list):
-        for st in data['subtasks']:
-            new_st = Subtask(
-                task_id=task.id,
-                text=st.get('text', ''),
-                done=st.get('done', False)
-            )
-            db.session.add(new_st)
-        db.session.commit()
+# ---------------------------
+# API - CREAR EVENTO
+# ---------------------------
+@tasks_api.route('/api/events', methods=['POST'])
+@login_required
+def create_event():
+    try:
+        task = new_task(request.get_json() or {}, current_user.id)
+    except TaskPayloadError as e:
+        return jsonify({"error": str(e)}), 400
 
+    # Tarea y subtareas en un único commit
+    db.session.add(task)
+    db.session.commit()
     return jsonify(serialize_task(task)), 201
 
 
@@ -159,77 +374,10 @@ def edit_event(event_id):
     if task.user_id != current_user.id:
         return jsonify({"error": "No autorizado"}), 403
 
-    # ----- Campos básicos -----
-    if 'title' in data:
-        task.title = data['title']
-
-    if 'start' in data:
-        start_str = data.get('start')
-        if start_str:
-            try:
-                task.start = datetime.strptime(start_str, '%Y-%m-%d').date()
-            except ValueError:
-                return jsonify({"error": "Formato de fecha de inicio inválido"}), 400
-        else:
-            task.start = None
-
-    if 'end' in data:
-        end_str = data.get('end')
-        if end_str:
-            try:
-                task.end = datetime.strptime(end_str, '%Y-%m-%d').date()
-            except ValueError:
-                return jsonify({"error": "Formato de fecha de fin inválido"}), 400
-        else:
-            task.end = None
-
-    if task.start and task.end and task.end < task.start:
-        return jsonify({"error": "La fecha de fin no puede ser anterior a la de inicio"}), 400
-
-    if 'priority' in data:
-        task.priority = int(data['priority'])
-
-    if 'tag' in data:
-        task.tag = data['tag']
-
-    if 'tagColor' in data:
-        task.tag_color = data['tagColor']
-
-    if 'completed' in data:
-        task.completed = bool(data['completed'])
-
-    if 'rruleText' in data:  # 💡 nombre igual que en frontend
-        task.rrule_text = data['rruleText']
-
-    # ----- Subtareas -----
-    if 'subtasks' in data and isinstance(data['subtasks'], list):
-        current_subtasks = {st.id: st for st in task.subtasks_rel.all()}
-        handled_ids = set()
-
-        for st_data in data['subtasks']:
-            st_id = st_data.get('id')
-            st_text = st_data.get('text', '')
-            st_done = st_data.get('done', False)
-
-            if st_id and st_id in current_subtasks:
-                # Editar subtarea existente
-                sub = current_subtasks[st_id]
-                sub.text = st_text
-                sub.done = st_done
-                handled_ids.add(st_id)
-            else:
-                # Crear subtarea nueva
-                new_st = Subtask(
-                    task_id=task.id,
-                    text=st_text,
-                    done=st_done
-                )
-                db.session.add(new_st)
-
-        # Eliminar las subtareas que ya no vienen
-        for st_id, st in current_subtasks.items():
-            if st_id not in handled_ids:
-                db.session.delete(st)
+    try:
+        update_task(task, data)
+    except TaskPayloadError as e:
+        return jsonify({"error": str(e)}), 400
 
     db.session.commit()
     return jsonify(serialize_task(task)), 200
@@ -303,3 +451,105 @@ def complete_event(event_id):
     db.session.commit()
 
     return jsonify(serialize_task(task)), 200
+
+
+# ---------------------------
+# API - OPERACIONES EN LOTE
+# ---------------------------
+MAX_BATCH_SIZE = 500
+BATCH_OPS = ('create', 'update', 'complete', 'delete')
+
+@tasks_api.route('/api/events/batch', methods=['POST'])
+@login_required
+def batch_events():
+    """
+    Aplica una lista de operaciones en una sola transacción:
+
+        [{"op": "create", "data": {...}},
+         {"op": "update", "id": 1, "data": {...}},
+         {"op": "complete", "id": 2, "completed": true},   # sin "completed" alterna
+         {"op": "delete", "id": 3}]
+
+    (también se acepta {"operations": [...]}). Las tareas afectadas se
+    cargan con una consulta, las escrituras se envían agrupadas en un
+    único flush y hay un único commit. Devuelve {"results": [...]} con un
+    resultado por operación y en el mismo orden; las que no validan no
+    se aplican pero no impiden las demás, salvo con ?atomic=1, en cuyo
+    caso cualquier fallo cancela el lote entero (409).
+    """
+    payload = request.get_json(silent=True)
+    operations = payload.get('operations') if isinstance(payload, dict) else payload
+    if not isinstance(operations, list):
+        return jsonify({"error": "Se esperaba una lista de operaciones"}), 400
+    if len(operations) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Máximo {MAX_BATCH_SIZE} operaciones por lote"}), 400
+    atomic = request.args.get('atomic') in ('1', 'true')
+
+    # Tareas y subtareas afectadas, cargadas en bloque
+    ids = {
+        op.get('id') for op in operations
+        if isinstance(op, dict) and op.get('op') != 'create' and isinstance(op.get('id'), int)
+    }
+    tasks = {}
+    if ids:
+        tasks = {t.id: t for t in Task.query.filter(Task.user_id == current_user.id, Task.id.in_(ids))}
+    with_subtasks = [
+        op['id'] for op in operations
+        if isinstance(op, dict) and op.get('op') == 'update' and op.get('id') in tasks
+        and isinstance((op.get('data') or {}).get('subtasks'), list)
+    ]
+    subtasks = defaultdict(dict)
+    if with_subtasks:
+        for st in Subtask.query.filter(Subtask.task_id.in_(with_subtasks)):
+            subtasks[st.task_id][st.id] = st
+
+    results = []
+    created, deleted = [], set()
+    for op in operations:
+        kind = op.get('op') if isinstance(op, dict) else None
+        try:
+            if kind not in BATCH_OPS:
+                raise TaskPayloadError("Operación desconocida")
+
+            if kind == 'create':
+                task = new_task(op.get('data') or {}, current_user.id)
+                db.session.add(task)
+                created.append((len(results), task))
+                results.append({"op": kind, "ok": True})
+                continue
+
+            task = tasks.get(op.get('id'))
+            if task is None or task.id in deleted:
+                raise TaskPayloadError("Tarea no encontrada")
+            if kind == 'update':
+                update_task(task, op.get('data') or {}, subtasks.get(task.id, {}))
+            elif kind == 'complete':
+                task.completed = bool(op['completed']) if 'completed' in op else not task.completed
+            else:
+                db.session.delete(task)
+                deleted.add(task.id)
+            results.append({"op": kind, "ok": True, "id": task.id})
+        except TaskPayloadError as e:
+            results.append({"op": kind, "ok": False, "id": op.get('id') if isinstance(op, dict) else None,
+                            "error": str(e)})
+
+    if atomic and any(not r['ok'] for r in results):
+        db.session.rollback()
+        return jsonify({"results": results}), 409
+
+    # Un único flush (inserciones y actualizaciones agrupadas) y un commit
+    db.session.flush()
+    for i, task in created:
+        results[i]['id'] = task.id
+    db.session.commit()
+
+    # Las tareas escritas se releen en una consulta (el commit las expira)
+    # y se serializan con sus subtareas en bloque
+    written = {r['id'] for r in results if r['ok'] and r['op'] != 'delete'} - deleted
+    if written:
+        fresh = Task.query.filter(Task.id.in_(written)).all()
+        serialized = {t.id: data for t, data in zip(fresh, serialize_tasks(fresh))}
+        for r in results:
+            if r['ok'] and r['id'] in serialized:
+                r['task'] = serialized[r['id']]
+    return jsonify({"results": results})
@@ -0,0 +1,97 @@
+"""
+Contadores del panel (tareas, metas y eventos próximos) por usuario.
+
+Se leen de la fila materializada `user_stats` junto con el número de
+eventos próximos en una sola consulta y se memorizan durante la
+petición en `g`. No se guardan entre peticiones: con varios workers
+una caché por proceso mostraría totales antiguos en los demás, y la
+consulta es una búsqueda por clave primaria.
+"""
+from datetime import datetime
+
+from flask import g, has_app_context
+from sqlalchemy import event, func, select
+
+from app.db import db
+from app.models import Event, Goal, Task, UserStats
+from app.utils.stats import get_user_stats
+
+# Modelos cuyas escrituras cambian los contadores
+_MODELOS = (Task, Goal, Event)
+
+
+def _consultar(user_id):
+    """
+    Lee los totales materializados y cuenta los eventos próximos
+    en un único viaje a la base de datos.
+    """
+    stmt = select(
+        UserStats.total_tasks,
+        UserStats.done_tasks,
+        UserStats.total_goals,
+        UserStats.done_goals,
+        select(func.count(Event.id))
+        .where(Event.user_id == user_id, Event.start >= datetime.utcnow())
+        .scalar_subquery(),
+    ).where(UserStats.user_id == user_id)
+    row = db.session.execute(stmt).one_or_none()
+    if row is None:
+        get_user_stats(user_id)  # crea la fila a partir de las tablas base
+        row = db.session.execute(stmt).one()
+
+    total_tareas, tareas_completadas, total_metas, metas_alcanzadas, proximos_eventos = row
+    return {
+        'total_tareas': total_tareas,
+        'tareas_pendientes': total_tareas - tareas_completadas,
+        'tareas_completadas': tareas_completadas,
+        'total_metas': total_metas,
+        'metas_alcanzadas': metas_alcanzadas,
+        'proximos_eventos': proximos_eventos,
+    }
+
+
+def get_counters(user_id):
+    """
+    Devuelve los contadores del usuario.
+    Dentro de una misma petición sólo se calculan una vez.
+    """
+    memo = g.setdefault('_contadores', {})
+    if user_id in memo:
+        return memo[user_id]
+
+    counters = memo[user_id] = _consultar(user_id)
+    return counters
+
+
+def invalidate(user_id):
+    """Descarta los contadores ya leídos en esta petición."""
+    if has_app_context():
+        g.get('_contadores', {}).pop(user_id, None)
+
+
+def build_notificaciones(counters):
+    """Mensajes del mini-asistente a partir de los contadores."""
+    notificaciones = []
+    if counters['tareas_pendientes'] > 0:
+        notificaciones.append(f"Tienes {counters['tareas_pendientes']} tarea(s) pendiente(s).")
+    if counters['proximos_eventos'] > 0:
+        notificaciones.append(f"Tienes {counters['proximos_eventos']} evento(s) próximamente.")
+    if counters['total_metas'] > 0 and counters['metas_alcanzadas'] < counters['total_metas']:
+        notificaciones.append(f"Has completado {counters['metas_alcanzadas']}/{counters['total_metas']} metas.")
+    if not notificaciones:
+        notificaciones.append("Todo al día. ¡Buen trabajo!")
+    return notificaciones
+
+
+# ---------------------------
+# INVALIDACIÓN AL ESCRIBIR
+# ---------------------------
+def _after_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _MODELOS) and obj.user_id is not None:
+            invalidate(obj.user_id)
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
@@ -0,0 +1,350 @@
+"""
+Diario: propiedad de los elementos y sincronización por diferencias.
+
+El cliente envía sólo lo que cambió desde la última carga, por tipo:
+
+    {"temas": {"created": [...], "updated": [...], "deleted": [...]},
+     "categorias": {...}, "subcategorias": {...}, "notas": {...}}
+
+- created: elementos con un id temporal del cliente; los hijos pueden
+  referirse a padres creados en el mismo parche por ese id.
+- updated: {"id", "version", ...campos}; sólo se tocan los campos que
+  vienen. Si la versión no coincide con la guardada, el elemento no se
+  modifica y se devuelve como conflicto.
+- deleted: ids, o {"id", "version"} para comprobar la versión.
+
+Los elementos afectados se cargan con una consulta por tipo y todas
+las escrituras salen en un único flush (que además comprueba e
+incrementa `version` de cada fila actualizada).
+
+Los listados de notas (`notas_query`, `pagina_notas`) no cargan
+`contenido`: leen el título y el extracto precalculados al escribir.
+El texto entero se pide nota a nota.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from app.db import db
+from app.models import DiarioApartado, DiarioCategoria, DiarioSubcategoria, DiarioTema
+from app.utils.ordering import append_key
+
+# Tipo -> (modelo, columna que agrupa cada lista ordenada)
+DIARIO_LISTAS = {
+    "tema": (DiarioTema, DiarioTema.user_id),
+    "categoria": (DiarioCategoria, DiarioCategoria.tema_id),
+    "subcategoria": (DiarioSubcategoria, DiarioSubcategoria.categoria_id),
+    "apartado": (DiarioApartado, DiarioApartado.user_id),
+}
+
+# Sección del payload -> tipo, en orden de dependencia (padres primero)
+SECCIONES = {
+    "temas": "tema",
+    "categorias": "categoria",
+    "subcategorias": "subcategoria",
+    "notas": "apartado",
+}
+
+# Tipo -> (campo del payload que apunta al padre, tipo del padre)
+PADRES = {
+    "categoria": ("temaId", "tema"),
+    "subcategoria": ("categoriaId", "categoria"),
+}
+
+
+class DiarioPatchError(ValueError):
+    """Parche mal formado; el mensaje se devuelve al cliente."""
+
+
+def diario_propios(user_id, tipo, *columnas):
+    """Consulta de `columnas` restringida a los elementos del usuario de ese tipo."""
+    query = db.session.query(*columnas)
+    if tipo == "categoria":
+        query = query.join(DiarioTema, DiarioCategoria.tema_id == DiarioTema.id)
+    elif tipo == "subcategoria":
+        query = query.join(DiarioCategoria, DiarioSubcategoria.categoria_id == DiarioCategoria.id) \
+            .join(DiarioTema, DiarioCategoria.tema_id == DiarioTema.id)
+    modelo = DiarioTema if tipo in ("categoria", "subcategoria") else DIARIO_LISTAS[tipo][0]
+    return query.filter(modelo.user_id == user_id)
+
+
+PAGINA_NOTAS = 50
+PAGINA_NOTAS_MAX = 200
+
+
+def lugar(nota):
+    """'tema:3', 'categoria:5', 'subcategoria:7' o 'root'."""
+    if nota.tema_id:
+        return f"tema:{nota.tema_id}"
+    if nota.categoria_id:
+        return f"categoria:{nota.categoria_id}"
+    if nota.subcategoria_id:
+        return f"subcategoria:{nota.subcategoria_id}"
+    return "root"
+
+
+def notas_query(user_id, place=None, extracto=False):
+    """
+    Notas del usuario (opcionalmente de un lugar) en su orden, sólo con
+    las columnas de los listados.
+    """
+    columnas = [
+        DiarioApartado.id, DiarioApartado.position, DiarioApartado.fecha_creacion,
+        DiarioApartado.version, DiarioApartado.tema_id, DiarioApartado.categoria_id,
+        DiarioApartado.subcategoria_id, DiarioApartado.titulo,
+    ]
+    if extracto:
+        columnas.append(DiarioApartado.extracto)
+    query = db.session.query(*columnas).filter(DiarioApartado.user_id == user_id)
+
+    tipo, ref = _lugar(place) if place != "all" else (None, None)
+    if tipo:
+        columna = getattr(DiarioApartado, f"{tipo}_id")
+        ref = _entero(ref)
+        if ref is None:
+            raise DiarioPatchError(f"Ubicación inválida: {place!r}")
+        query = query.filter(columna == ref)
+    elif place == "root":
+        query = query.filter(
+            DiarioApartado.tema_id.is_(None),
+            DiarioApartado.categoria_id.is_(None),
+            DiarioApartado.subcategoria_id.is_(None),
+        )
+    return query.order_by(DiarioApartado.position, DiarioApartado.id)
+
+
+def resumen(fila, extracto=False):
+    """Fila de `notas_query` -> nota para el cliente (sin `content`)."""
+    nota = {
+        "id": fila.id,
+        "title": fila.titulo,
+        "createdAt": fila.fecha_creacion.isoformat(),
+        "version": fila.version,
+        "place": lugar(fila),
+    }
+    if extracto:
+        nota["snippet"] = fila.extracto
+    return nota
+
+
+def pagina_notas(user_id, place=None, after=None, limit=PAGINA_NOTAS):
+    """
+    Una página de notas con extracto, por cursor sobre (position, id):
+    devuelve (notas, cursor de la siguiente página o None).
+    """
+    query = notas_query(user_id, place, extracto=True)
+    if after:
+        position, _, ultimo = after.rpartition(".")
+        ultimo = _entero(ultimo)
+        if not position or ultimo is None:
+            raise DiarioPatchError(f"Cursor inválido: {after!r}")
+        query = query.filter(or_(
+            DiarioApartado.position > position,
+            and_(DiarioApartado.position == position, DiarioApartado.id > ultimo),
+        ))
+    filas = query.limit(limit + 1).all()
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = f"{filas[-1].position}.{filas[-1].id}"
+    return [resumen(f, extracto=True) for f in filas], siguiente
+
+
+def _fecha(valor):
+    try:
+        return datetime.fromisoformat(valor.replace("Z", "+00:00")).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        raise DiarioPatchError(f"Fecha inválida: {valor!r}")
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _lugar(place):
+    """'tema:3' -> ('tema', '3'); 'root' o vacío -> (None, None)."""
+    if not place or place == "root":
+        return None, None
+    tipo, _, ref = str(place).partition(":")
+    if tipo not in ("tema", "categoria", "subcategoria") or not ref:
+        raise DiarioPatchError(f"Ubicación inválida: {place!r}")
+    return tipo, ref
+
+
+def _normalizar(parche):
+    """Valida la forma del parche y devuelve {tipo: (created, updated, deleted)}."""
+    if not isinstance(parche, dict):
+        raise DiarioPatchError("Se esperaba un objeto")
+    resultado = {}
+    for seccion, tipo in SECCIONES.items():
+        cambios = parche.get(seccion) or {}
+        if not isinstance(cambios, dict):
+            raise DiarioPatchError(f"Sección inválida: {seccion}")
+        listas = []
+        for clave in ("created", "updated", "deleted"):
+            items = cambios.get(clave) or []
+            if not isinstance(items, list):
+                raise DiarioPatchError(f"{seccion}.{clave} debe ser una lista")
+            if clave == "deleted":
+                items = [i if isinstance(i, dict) else {"id": i} for i in items]
+            if not all(isinstance(i, dict) and "id" in i for i in items):
+                raise DiarioPatchError(f"{seccion}.{clave}: cada elemento necesita un id")
+            listas.append(items)
+        resultado[tipo] = tuple(listas)
+    return resultado
+
+
+class _Parche:
+    def __init__(self, user_id, cambios):
+        self.user_id = user_id
+        self.cambios = cambios
+        self.nuevos = {tipo: {} for tipo in DIARIO_LISTAS}      # id temporal -> objeto
+        self.existentes = {tipo: {} for tipo in DIARIO_LISTAS}  # id -> objeto del usuario
+        self.borrados = set()
+        self.conflictos = []
+        self.ultimas = {}
+
+    # --- Carga en bloque ---
+    def cargar(self):
+        """Una consulta por tipo con todo lo que el parche toca o referencia."""
+        ids = {tipo: set() for tipo in DIARIO_LISTAS}
+        temporales = {tipo: {str(i["id"]) for i in created} for tipo, (created, _, _) in self.cambios.items()}
+
+        def referencia(tipo, ref):
+            if ref is not None and str(ref) not in temporales[tipo] and _entero(ref) is not None:
+                ids[tipo].add(_entero(ref))
+
+        for tipo, (created, updated, deleted) in self.cambios.items():
+            for item in updated + deleted:
+                referencia(tipo, item["id"])
+            for item in created + updated:
+                if tipo in PADRES:
+                    campo, padre = PADRES[tipo]
+                    referencia(padre, item.get(campo))
+                elif tipo == "apartado" and "place" in item:
+                    lugar, ref = _lugar(item["place"])
+                    if lugar:
+                        referencia(lugar, ref)
+
+        for tipo, pendientes in ids.items():
+            if pendientes:
+                modelo = DIARIO_LISTAS[tipo][0]
+                for obj in diario_propios(self.user_id, tipo, modelo).filter(modelo.id.in_(pendientes)):
+                    self.existentes[tipo][obj.id] = obj
+
+    def resolver(self, tipo, ref):
+        """Objeto (nuevo o existente del usuario) al que apunta una referencia."""
+        obj = self.nuevos[tipo].get(str(ref))
+        if obj is None:
+            obj = self.existentes[tipo].get(_entero(ref))
+        if obj is None:
+            raise DiarioPatchError(f"{tipo} {ref!r} no encontrado")
+        return obj
+
+    def posicion(self, tipo, padre):
+        """Clave al final de la lista del padre (o del usuario)."""
+        modelo, grupo = DIARIO_LISTAS[tipo]
+        if padre is None:
+            return append_key(modelo, grupo, self.user_id, self.ultimas)
+        if padre.id is None:
+            self.ultimas.setdefault((modelo, padre), None)  # padre nuevo: lista vacía
+            return append_key(modelo, grupo, padre, self.ultimas)
+        return append_key(modelo, grupo, padre.id, self.ultimas)
+
+    # --- Campos ---
+    def asignar(self, tipo, obj, item):
+        if tipo == "tema":
+            if "name" in item:
+                obj.titulo = item["name"]
+            if item.get("createdAt"):
+                obj.fecha_creacion = _fecha(item["createdAt"])
+        elif tipo in PADRES:
+            if "name" in item:
+                obj.nombre = item["name"]
+            campo, padre = PADRES[tipo]
+            if campo in item:
+                setattr(obj, padre, self.resolver(padre, item[campo]))
+        else:
+            if "content" in item:
+                obj.contenido = item["content"] or ""
+            if item.get("createdAt"):
+                obj.fecha_creacion = _fecha(item["createdAt"])
+            if "place" in item:
+                lugar, ref = _lugar(item["place"])
+                obj.tema = self.resolver("tema", ref) if lugar == "tema" else None
+                obj.categoria = self.resolver("categoria", ref) if lugar == "categoria" else None
+                obj.subcategoria = self.resolver("subcategoria", ref) if lugar == "subcategoria" else None
+
+    def comprobar_version(self, tipo, obj, item):
+        version = item.get("version")
+        if version is not None and _entero(version) != obj.version:
+            self.conflictos.append({"tipo": tipo, "id": obj.id, "version": obj.version})
+            return False
+        return True
+
+    # --- Aplicación ---
+    def aplicar(self):
+        modelo_de = {tipo: DIARIO_LISTAS[tipo][0] for tipo in DIARIO_LISTAS}
+        for tipo, (created, _, _) in self.cambios.items():
+            for item in created:
+                obj = modelo_de[tipo]()
+                if tipo in ("tema", "apartado"):
+                    obj.user_id = self.user_id
+                self.asignar(tipo, obj, item)
+                if (tipo == "tema" and not obj.titulo) or (tipo in PADRES and not obj.nombre):
+                    raise DiarioPatchError(f"{tipo}: el nombre es obligatorio")
+                if tipo in PADRES and getattr(obj, PADRES[tipo][1]) is None:
+                    raise DiarioPatchError(f"{tipo}: falta el padre ({PADRES[tipo][0]})")
+                if tipo == "apartado" and obj.contenido is None:
+                    obj.contenido = ""
+                obj.position = self.posicion(tipo, getattr(obj, PADRES[tipo][1]) if tipo in PADRES else None)
+                db.session.add(obj)
+                self.nuevos[tipo][str(item["id"])] = obj
+
+        for tipo, (_, updated, _) in self.cambios.items():
+            for item in updated:
+                obj = self.existentes[tipo].get(_entero(item["id"]))
+                if obj is None:
+                    self.conflictos.append({"tipo": tipo, "id": item["id"], "version": None})
+                elif self.comprobar_version(tipo, obj, item):
+                    self.asignar(tipo, obj, item)
+
+        # Borrados de hijos a padres: la cascada del ORM se encarga del resto
+        for tipo, (_, _, deleted) in reversed(list(self.cambios.items())):
+            for item in deleted:
+                obj = self.existentes[tipo].get(_entero(item["id"]))
+                if obj is not None and self.comprobar_version(tipo, obj, item):
+                    db.session.delete(obj)
+                    self.borrados.add(obj)
+
+
+def apply_patch(user_id, parche):
+    """
+    Aplica un parche del diario en la sesión actual con un único flush
+    (el commit lo hace la ruta). Devuelve los ids reales de lo creado,
+    la versión nueva de lo creado o modificado y los conflictos.
+    Lanza DiarioPatchError si el parche no es válido y StaleDataError si
+    otra petición modificó una fila entre la carga y el flush.
+    """
+    estado = _Parche(user_id, _normalizar(parche))
+    with db.session.no_autoflush:
+        estado.cargar()
+        estado.aplicar()
+    db.session.flush()
+
+    secciones = {tipo: seccion for seccion, tipo in SECCIONES.items()}
+    ids = {seccion: {} for seccion in SECCIONES}
+    versiones = {seccion: {} for seccion in SECCIONES}
+    for tipo, nuevos in estado.nuevos.items():
+        for temporal, obj in nuevos.items():
+            ids[secciones[tipo]][temporal] = obj.id
+            versiones[secciones[tipo]][obj.id] = obj.version
+    for tipo, (_, updated, _) in estado.cambios.items():
+        for item in updated:
+            obj = estado.existentes[tipo].get(_entero(item["id"]))
+            if obj is not None and obj not in estado.borrados:
+                versiones[secciones[tipo]][obj.id] = obj.version
+    return {"ids": ids, "versions": versiones, "conflicts": estado.conflictos}
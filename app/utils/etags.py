@@ -0,0 +1,147 @@
+"""
+Respuestas condicionales (ETag / If-None-Match) para las lecturas JSON.
+
+Cada recurso de un usuario tiene un contador de escrituras en su fila
+de `user_stats` que se incrementa en el mismo flush que lo modifica.
+El ETag de una lectura es (usuario, recurso, contador): se obtiene con
+una consulta por clave primaria y, si coincide con el del cliente, se
+responde 304 sin ejecutar la vista. Las tareas reutilizan `task_seq`,
+que ya mantiene app/utils/sync.py.
+
+Las rutas que escriben con sentencias masivas (UPDATE/DELETE sin pasar
+por el ORM) deben llamar a `touch`.
+"""
+from collections import defaultdict
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import event, inspect, select, update
+
+from app.db import db
+from app.models import (
+    Category, DiarioApartado, DiarioCategoria, DiarioSubcategoria, DiarioTema,
+    Goal, ScheduleTask, Template, UserStats,
+)
+from app.utils.stats import rebuild_user_stats
+
+# Recurso -> contador en user_stats
+CONTADORES = {
+    'events': 'task_seq',
+    'goals': 'goal_seq',
+    'categories': 'category_seq',
+    'week': 'schedule_seq',
+    'templates': 'template_seq',
+    'diario': 'diario_seq',
+}
+
+# Modelo -> recursos cuyas respuestas incluyen sus datos
+RECURSOS = {
+    Goal: ('goals',),
+    Category: ('goals', 'categories'),  # las metas llevan el nombre de su categoría
+    ScheduleTask: ('week',),
+    Template: ('templates',),
+    DiarioTema: ('diario',),
+    DiarioCategoria: ('diario',),
+    DiarioSubcategoria: ('diario',),
+    DiarioApartado: ('diario',),
+}
+
+
+def version(user_id, resource):
+    columna = getattr(UserStats, CONTADORES[resource])
+    return db.session.execute(select(columna).where(UserStats.user_id == user_id)).scalar() or 0
+
+
+def touch(user_id, *resources, connection=None):
+    """Incrementa los contadores de esos recursos del usuario."""
+    connection = connection or db.session.connection()
+    valores = {
+        CONTADORES[r]: getattr(UserStats, CONTADORES[r]) + 1 for r in resources
+    }
+    stmt = update(UserStats.__table__).where(UserStats.user_id == user_id).values(**valores)
+    if connection.execute(stmt).rowcount == 0:
+        rebuild_user_stats(user_id, connection)
+        connection.execute(stmt)
+
+
+def conditional(resource):
+    """
+    Decorador de vistas GET: añade el ETag del recurso y responde 304
+    si el cliente ya lo tiene. El contador se lee antes que los datos,
+    así que una escritura concurrente sólo puede dejar un ETag antiguo.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = f"{current_user.id}-{resource}-{version(current_user.id, resource)}"
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # El navegador puede guardarla, pero debe revalidarla siempre
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def _owners(connection, objs):
+    """Usuario de cada objeto; categorías y subcategorías del diario lo heredan del tema."""
+    temas, categorias = {}, {}
+    for obj in objs:
+        estado = inspect(obj).dict
+        if isinstance(obj, DiarioCategoria):
+            tema = estado.get('tema')
+            if tema is not None:
+                temas[obj.tema_id] = tema.user_id
+        elif isinstance(obj, DiarioSubcategoria):
+            categoria = estado.get('categoria')
+            if categoria is not None and inspect(categoria).dict.get('tema') is not None:
+                categorias[obj.categoria_id] = categoria.tema.user_id
+
+    faltan_temas = {o.tema_id for o in objs if isinstance(o, DiarioCategoria)} - set(temas)
+    if faltan_temas:
+        temas.update(connection.execute(
+            select(DiarioTema.id, DiarioTema.user_id).where(DiarioTema.id.in_(faltan_temas))
+        ).all())
+    faltan_categorias = {o.categoria_id for o in objs if isinstance(o, DiarioSubcategoria)} - set(categorias)
+    if faltan_categorias:
+        categorias.update(connection.execute(
+            select(DiarioCategoria.id, DiarioTema.user_id)
+            .join(DiarioTema, DiarioCategoria.tema_id == DiarioTema.id)
+            .where(DiarioCategoria.id.in_(faltan_categorias))
+        ).all())
+
+    for obj in objs:
+        if isinstance(obj, DiarioCategoria):
+            yield obj, temas.get(obj.tema_id)
+        elif isinstance(obj, DiarioSubcategoria):
+            yield obj, categorias.get(obj.categoria_id)
+        else:
+            yield obj, obj.user_id
+
+
+def _after_flush(session, flush_context):
+    objs = [
+        obj for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in RECURSOS and (obj not in session.dirty or session.is_modified(obj))
+    ]
+    if not objs:
+        return
+    connection = session.connection()
+    cambios = defaultdict(set)
+    for obj, user_id in _owners(connection, objs):
+        if user_id is not None:
+            cambios[user_id].update(RECURSOS[type(obj)])
+    for user_id, resources in cambios.items():
+        touch(user_id, *resources, connection=connection)
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
@@ -0,0 +1,157 @@
+"""
+Hash de contraseñas configurable y fuera del hilo de la petición.
+
+El algoritmo y su coste salen de la configuración
+(PASSWORD_HASH_ALGORITHM = scrypt | pbkdf2, PASSWORD_HASH_COST = N de
+scrypt o iteraciones de pbkdf2). Los hashes se siguen generando con
+Werkzeug, así que los ya guardados siguen siendo válidos; al iniciar
+sesión se rehacen si se generaron con otros parámetros (`needs_rehash`).
+Un coste no válido (N de scrypt que no es potencia de 2, iteraciones no
+positivas) hace fallar el arranque en lugar de cada registro.
+
+Calcular y verificar se hace en un pool de PASSWORD_HASH_WORKERS hilos
+por proceso. Como mucho PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE
+peticiones esperan a la vez; si no hay sitio en PASSWORD_HASH_WAIT
+segundos se lanza `HashingBusy` en lugar de acumular trabajo, de modo
+que una ráfaga de inicios de sesión no deja sin CPU al resto de rutas.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+passwords_cli = AppGroup('passwords', help='Hash de contraseñas.')
+
+ALGORITHMS = ('scrypt', 'pbkdf2')
+DEFAULT_COST = {'scrypt': 2 ** 15, 'pbkdf2': DEFAULT_PBKDF2_ITERATIONS}
+
+
+class HashingBusy(Exception):
+    """Hay demasiados hashes en curso o en espera."""
+
+
+def method(algorithm=None, cost=None):
+    """Método de Werkzeug (p. ej. 'scrypt:32768:8:1') según la configuración."""
+    config = current_app.config if has_app_context() else {}
+    algorithm = algorithm or config.get('PASSWORD_HASH_ALGORITHM') or 'scrypt'
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algoritmo de hash no soportado: {algorithm}")
+    cost = cost or config.get('PASSWORD_HASH_COST') or DEFAULT_COST[algorithm]
+    if algorithm == 'scrypt' and (cost < 2 or cost & (cost - 1)):
+        raise ValueError(f"El coste de scrypt debe ser una potencia de 2 mayor que 1: {cost}")
+    if algorithm == 'pbkdf2' and cost < 1:
+        raise ValueError(f"Las iteraciones de pbkdf2 deben ser positivas: {cost}")
+    return f"scrypt:{cost}:8:1" if algorithm == 'scrypt' else f"pbkdf2:sha256:{cost}"
+
+
+def needs_rehash(pwhash):
+    """El hash se generó con otro algoritmo o coste que los configurados."""
+    return pwhash.split('$', 1)[0] != method()
+
+
+# ---------------------------
+# POOL ACOTADO
+# ---------------------------
+def _executor_class():
+    # Con gevent los hilos parcheados son greenlets y el hash bloquearía el
+    # worker entero: se usan hilos reales del sistema
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+            return GeventExecutor
+    except ImportError:
+        pass
+    return ThreadPoolExecutor
+
+
+class _Pool:
+    def __init__(self, workers, queue, wait):
+        self.workers = workers
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Se crea en el primer uso de cada proceso: los hilos no sobreviven a un fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = _executor_class()(self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            raise HashingBusy()
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+
+def _run(fn, *args):
+    # Fuera de la app (migraciones, scripts) se calcula directamente
+    pool = current_app.extensions.get('password_hashing') if has_app_context() else None
+    return pool.run(fn, *args) if pool else fn(*args)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, method())
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+# ---------------------------
+# BENCHMARK
+# ---------------------------
+def _medir(metodo, seconds):
+    n, fin = 0, time.perf_counter() + seconds
+    while time.perf_counter() < fin:
+        generate_password_hash('benchmark', metodo)
+        n += 1
+    return n
+
+
+@passwords_cli.command('bench')
+@click.option('--algorithm', type=click.Choice(ALGORITHMS), default=None, help='Por defecto, el configurado.')
+@click.option('--cost', type=int, default=None, help='Por defecto, el configurado.')
+@click.option('--seconds', type=float, default=3.0, show_default=True)
+@click.option('--threads', type=int, default=None, help='Hilos en paralelo (por defecto, nº de núcleos).')
+def bench_command(algorithm, cost, seconds, threads):
+    """Mide cuántos hashes por segundo y por núcleo calcula esta máquina."""
+    try:
+        metodo = method(algorithm, cost)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    nucleos = os.cpu_count() or 1
+    threads = threads or nucleos
+
+    uno = _medir(metodo, seconds) / seconds
+    click.echo(f"{metodo}: {uno:.1f} hash/s en un hilo ({1000 / uno:.1f} ms por hash)")
+
+    with ThreadPoolExecutor(threads) as executor:
+        total = sum(executor.map(lambda _: _medir(metodo, seconds), range(threads))) / seconds
+    click.echo(
+        f"{threads} hilo(s): {total:.1f} hash/s en total, "
+        f"{total / min(threads, nucleos):.1f} hash/s por núcleo ({nucleos} núcleo(s))"
+    )
+
+
+def init_app(app):
+    # Comprueba la configuración al arrancar (lanza ValueError)
+    method(app.config.get('PASSWORD_HASH_ALGORITHM'), app.config.get('PASSWORD_HASH_COST'))
+    app.extensions['password_hashing'] = _Pool(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue=app.config.get('PASSWORD_HASH_QUEUE', 8),
+        wait=app.config.get('PASSWORD_HASH_WAIT', 5),
+    )
+    app.cli.add_command(passwords_cli)
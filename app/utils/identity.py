@@ -0,0 +1,98 @@
+"""
+Identidad del usuario de la sesión sin consultar la base de datos.
+
+Flask-Login resuelve `current_user` en cada petición autenticada. En
+lugar de cargar la fila `User` completa se usa un `Principal` ligero
+(id y nombre de usuario), que se guarda en una caché LRU en memoria
+con caducidad. Las vistas que necesiten la fila la piden con
+`principal.user`.
+
+La entrada se descarta al confirmar un cambio de contraseña o de
+nombre, o el borrado del usuario. Cada proceso (worker) tiene su
+caché, así que en los demás la entrada puede durar hasta que caduque
+(USER_CACHE_TTL).
+"""
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, select
+
+from app.db import db
+from app.models import User
+from app.utils.cache import TTLCache
+
+_cache = TTLCache(maxsize=4096, ttl=60)
+
+# Cambios en estos atributos invalidan la identidad cacheada
+_ATRIBUTOS = ('password_hash', 'username')
+
+
+class Principal(UserMixin):
+    """Usuario autenticado tal y como lo ve Flask-Login: sólo id y nombre."""
+
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    @property
+    def user(self):
+        """Fila `User` completa (una consulta la primera vez en la petición)."""
+        return db.session.get(User, self.id)
+
+    def __repr__(self):
+        return f"<Principal {self.username}>"
+
+
+def cache_principal(user):
+    """Guarda la identidad de un usuario recién autenticado."""
+    principal = Principal(user.id, user.username)
+    _cache.set(user.id, principal, ttl=current_app.config.get('USER_CACHE_TTL', 60))
+    return principal
+
+
+def load_principal(user_id):
+    """`user_loader` de Flask-Login: caché y, si no está, una consulta por clave primaria."""
+    principal = _cache.get(user_id)
+    if principal is None:
+        row = db.session.execute(select(User.id, User.username).where(User.id == user_id)).one_or_none()
+        if row is None:
+            return None
+        principal = cache_principal(row)
+    return principal
+
+
+def invalidate(user_id):
+    _cache.pop(user_id)
+
+
+# ---------------------------
+# INVALIDACIÓN AL ESCRIBIR
+# ---------------------------
+def _after_flush(session, flush_context):
+    pendientes = session.info.setdefault('identidades_pendientes', set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            pendientes.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[a].history.has_changes() for a in _ATRIBUTOS):
+                pendientes.add(obj.id)
+
+
+def _after_commit(session):
+    for user_id in session.info.pop('identidades_pendientes', ()):
+        invalidate(user_id)
+
+
+def _after_rollback(session):
+    session.info.pop('identidades_pendientes', None)
+
+
+def init_app(app):
+    _cache.maxsize = app.config.get('USER_CACHE_SIZE', _cache.maxsize)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,202 @@
+"""
+Prueba de carga contra un servidor en marcha y comparación de modos.
+
+`flask loadtest run` lanza N clientes concurrentes (hilos con conexión
+keep-alive) que inician sesión y piden en bucle las rutas JSON durante
+unos segundos; informa de peticiones por segundo, errores y latencias.
+El usuario se indica siempre (--username/--password); sólo con
+--register se da de alta antes, p. ej. contra una base de datos de prueba.
+
+`flask loadtest compare` arranca gunicorn con gunicorn.conf.py en cada
+modo (WEB_WORKER_CLASS), repite la prueba y muestra una tabla. Los modos
+cuyo worker no está instalado (p. ej. gevent) se omiten.
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+import click
+from flask.cli import AppGroup
+
+loadtest_cli = AppGroup('loadtest', help='Pruebas de carga del servidor.')
+
+_LUNES = date.today() - timedelta(days=date.today().weekday())
+RUTAS = f'/api/goals,/api/events,/api/week?start={_LUNES},/api/templates,/api/diario/tree'
+MODOS = ('sync', 'gthread', 'gevent')
+
+
+class _Cliente:
+    """Un usuario simulado: una conexión keep-alive y su cookie de sesión."""
+
+    def __init__(self, url, timeout=10):
+        partes = urlsplit(url)
+        self.host, self.port = partes.hostname, partes.port or 80
+        self.timeout = timeout
+        self.cookie = None
+        self.conn = None
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        cabeceras = {'Cookie': self.cookie} if self.cookie else {}
+        if cuerpo is not None:
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        for intento in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = self.conn.getresponse()
+                respuesta.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # El servidor cerró la conexión (keep-alive agotado): se reintenta una vez
+                self.conn.close()
+                self.conn = None
+                if intento:
+                    raise
+        cookie = respuesta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return respuesta.status
+
+    def entrar(self, username, password, register=False):
+        datos = {'username': username, 'password': password}
+        if register:
+            self.pedir('POST', '/auth/register', urlencode({**datos, 'confirm_password': password}))
+        if self.pedir('POST', '/auth/login', urlencode(datos)) != 302:
+            raise click.ClickException(f"No se pudo iniciar sesión como {username}")
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0.0
+
+
+def carga(url, rutas, concurrency, duration, username, password, register=False):
+    """Ejecuta la prueba y devuelve {peticiones, errores, rps, p50, p95, p99} (ms)."""
+    clientes = [_Cliente(url) for _ in range(concurrency)]
+    for i, cliente in enumerate(clientes):
+        cliente.entrar(username, password, register and i == 0)
+
+    latencias, errores = [], [0]
+    lock = threading.Lock()
+    inicio = threading.Event()
+
+    def trabajar(cliente):
+        propias, fallos, i = [], 0, 0
+        inicio.wait()
+        while time.perf_counter() < fin:
+            t0 = time.perf_counter()
+            try:
+                ok = cliente.pedir('GET', rutas[i % len(rutas)]) == 200
+            except (http.client.HTTPException, OSError):
+                ok = False
+            propias.append(time.perf_counter() - t0)
+            fallos += not ok
+            i += 1
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallos
+
+    hilos = [threading.Thread(target=trabajar, args=(c,)) for c in clientes]
+    for hilo in hilos:
+        hilo.start()
+    fin = time.perf_counter() + duration
+    inicio.set()
+    for hilo in hilos:
+        hilo.join()
+
+    latencias.sort()
+    return {
+        'peticiones': len(latencias),
+        'errores': errores[0],
+        'rps': len(latencias) / duration,
+        'p50': _percentil(latencias, 0.50) * 1000,
+        'p95': _percentil(latencias, 0.95) * 1000,
+        'p99': _percentil(latencias, 0.99) * 1000,
+    }
+
+
+def _linea(nombre, r):
+    return (f"{nombre:<10} {r['rps']:>9.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} "
+            f"{r['p99']:>8.1f} {r['peticiones']:>9} {r['errores']:>7}")
+
+
+CABECERA = f"{'modo':<10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peticiones':>9} {'errores':>7}"
+
+
+def _opciones(f):
+    f = click.option('--paths', default=RUTAS, show_default=True, help='Rutas separadas por comas.')(f)
+    f = click.option('--concurrency', '-c', default=20, show_default=True, help='Clientes simultáneos.')(f)
+    f = click.option('--duration', '-d', default=10.0, show_default=True, help='Segundos de carga.')(f)
+    f = click.option('--username', required=True, help='Usuario con el que inician sesión los clientes.')(f)
+    f = click.option('--password', required=True)(f)
+    f = click.option('--register', is_flag=True, help='Dar de alta el usuario antes de la prueba.')(f)
+    return f
+
+
+@loadtest_cli.command('run')
+@click.option('--url', default='http://127.0.0.1:8000', show_default=True)
+@_opciones
+def run_command(url, paths, concurrency, duration, username, password, register):
+    """Carga un servidor ya arrancado."""
+    r = carga(url, paths.split(','), concurrency, duration, username, password, register)
+    click.echo(CABECERA)
+    click.echo(_linea(urlsplit(url).netloc, r))
+
+
+def _esperar_puerto(port, proceso, segundos=30):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+@loadtest_cli.command('compare')
+@click.option('--modes', default=','.join(MODOS), show_default=True, help='Valores de WEB_WORKER_CLASS.')
+@click.option('--port', default=8765, show_default=True)
+@_opciones
+def compare_command(modes, port, paths, concurrency, duration, username, password, register):
+    """Arranca gunicorn en cada modo con la misma base de datos y compara el rendimiento."""
+    raiz = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    filas = []
+    for modo in modes.split(','):
+        if modo == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                click.echo("gevent: no instalado, se omite")
+                continue
+        entorno = {**os.environ, 'WEB_WORKER_CLASS': modo, 'PORT': str(port)}
+        proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+            cwd=raiz, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not _esperar_puerto(port, proceso):
+                click.echo(f"{modo}: gunicorn no arrancó, se omite")
+                continue
+            filas.append((modo, carga(f"http://127.0.0.1:{port}", paths.split(','),
+                                      concurrency, duration, username, password, register)))
+            register = False  # la base de datos es la misma en todos los modos
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    click.echo(CABECERA)
+    for modo, r in filas:
+        click.echo(_linea(modo, r))
+
+
+def init_app(app):
+    app.cli.add_command(loadtest_cli)
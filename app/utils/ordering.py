@@ -0,0 +1,280 @@
+"""
+Utilidades de ordenación de listas (metas, diario...).
+
+El orden se guarda como claves fraccionarias (ver `key_between`):
+insertar o mover un elemento calcula una clave entre sus vecinos y
+escribe una sola fila.
+
+`apply_orders` escribe el nuevo orden de muchas filas con una sola
+sentencia `UPDATE ... SET col = CASE id WHEN ... END`, restringida a
+las filas del usuario (la propiedad se valida en el propio WHERE) y sólo
+a las que realmente cambian de posición.
+"""
+from bisect import bisect_left
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, update
+
+from app.db import db
+from app.models import DiarioApartado, DiarioCategoria, DiarioSubcategoria, DiarioTema, Goal
+
+# Máximo de filas por sentencia (cada fila usa varios parámetros)
+ORDER_BATCH_SIZE = 500
+
+# Listas ordenadas por clave: nombre -> (modelo, columna que agrupa cada lista)
+ORDERED_LISTS = {
+    'goals': (Goal, Goal.user_id),
+    'diario-temas': (DiarioTema, DiarioTema.user_id),
+    'diario-categorias': (DiarioCategoria, DiarioCategoria.tema_id),
+    'diario-subcategorias': (DiarioSubcategoria, DiarioSubcategoria.categoria_id),
+    'diario-apartados': (DiarioApartado, DiarioApartado.user_id),
+}
+
+order_cli = AppGroup('order', help='Claves de orden de las listas.')
+
+
+def apply_orders(model, orders, *criteria, column='position'):
+    """
+    Aplica {id: valor} sobre `model.<column>` para las filas que cumplen
+    `criteria` (p. ej. `Goal.user_id == user_id`). Los ids ajenos se
+    ignoran. Devuelve el número de filas modificadas.
+    """
+    col = getattr(model, column)
+    ids = list(orders)
+    total = 0
+    for i in range(0, len(ids), ORDER_BATCH_SIZE):
+        chunk = {pk: orders[pk] for pk in ids[i:i + ORDER_BATCH_SIZE]}
+        nuevo = case(chunk, value=model.id)
+        stmt = (
+            update(model)
+            .where(model.id.in_(chunk), col.is_distinct_from(nuevo), *criteria)
+            .values({column: nuevo})
+            .execution_options(synchronize_session=False)
+        )
+        total += db.session.execute(stmt).rowcount
+    return total
+
+
+# ---------------------------
+# CLAVES DE ORDEN FRACCIONARIAS
+# ---------------------------
+# Las posiciones son cadenas que se comparan lexicográficamente. Cada
+# clave tiene una parte entera de longitud variable (el primer carácter
+# indica su longitud: 'a' = 1 dígito, 'b' = 2...; 'Z', 'Y'... para las
+# negativas) y una parte fraccionaria en base 62 que nunca termina en
+# '0', así que siempre existe una clave entre dos dadas. Añadir al
+# principio o al final incrementa la parte entera (claves cortas);
+# insertar entre dos vecinos alarga la fracción. Mover un elemento sólo
+# reescribe su clave; si alguna crece demasiado se redistribuyen las de
+# la lista entera (rebalanceo).
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+MAX_KEY_LENGTH = 32
+_SMALLEST_INT = 'A' + '0' * 26
+
+
+def _int_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f"Clave de orden inválida: {head!r}")
+
+
+def _split(key):
+    n = _int_length(key[0])
+    return key[:n], key[n:]
+
+
+def _increment_int(x):
+    head, digits = x[0], list(x[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = '0'
+    # Desbordamiento: cambia la longitud de la parte entera
+    if head == 'Z':
+        return 'a0'
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append('0')
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_int(x):
+    head, digits = x[0], list(x[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _midpoint(a, b):
+    """Fracción entre `a` y `b` (b=None es el infinito); a < b, sin ceros finales."""
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else '0') == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    lo = DIGITS.index(a[0]) if a else 0
+    hi = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if hi - lo > 1:
+        return DIGITS[(lo + hi) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[lo] + _midpoint(a[1:], None)
+
+
+def key_between(a, b):
+    """Clave estrictamente entre `a` y `b` (None = sin vecino por ese lado)."""
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"{a!r} no es menor que {b!r}")
+    if a is None and b is None:
+        return 'a0'
+    if a is None:
+        int_b, frac_b = _split(b)
+        if int_b == _SMALLEST_INT:
+            return int_b + _midpoint('', frac_b)
+        if frac_b:
+            return int_b
+        return _decrement_int(int_b)
+    int_a, frac_a = _split(a)
+    if b is None:
+        nxt = _increment_int(int_a)
+        return int_a + _midpoint(frac_a, None) if nxt is None else nxt
+    int_b, frac_b = _split(b)
+    if int_a == int_b:
+        return int_a + _midpoint(frac_a, frac_b)
+    nxt = _increment_int(int_a)
+    if nxt is not None and nxt < b:
+        return nxt
+    return int_a + _midpoint(frac_a, None)
+
+
+def keys_between(a, b, n):
+    """`n` claves crecientes entre `a` y `b`, repartidas para que sean cortas."""
+    if n <= 0:
+        return []
+    mid = key_between(a, b)
+    half = n // 2
+    return keys_between(a, mid, half) + [mid] + keys_between(mid, b, n - half - 1)
+
+
+def reposition(ids, keys):
+    """
+    Calcula las claves mínimas para dejar `ids` en ese orden.
+
+    `keys` es {id: clave actual}. Los elementos que ya están en orden
+    relativo (la subsecuencia creciente más larga) conservan su clave y
+    sólo se generan claves nuevas para los demás, entre sus vecinos.
+    Devuelve {id: clave nueva} únicamente para los que cambian.
+    """
+    ids = [pk for pk in ids if pk in keys]
+    # Subsecuencia estrictamente creciente más larga (paciencia, O(n log n))
+    tails, tails_idx, prev = [], [], [None] * len(ids)
+    for i, pk in enumerate(ids):
+        key = keys[pk]
+        if key is None:
+            continue
+        pos = bisect_left(tails, key)
+        prev[i] = tails_idx[pos - 1] if pos else None
+        if pos == len(tails):
+            tails.append(key)
+            tails_idx.append(i)
+        else:
+            tails[pos] = key
+            tails_idx[pos] = i
+    keep = set()
+    i = tails_idx[-1] if tails_idx else None
+    while i is not None:
+        keep.add(i)
+        i = prev[i]
+
+    changes = {}
+    run, lo = [], None
+    for i, pk in enumerate(ids + [None]):
+        if i < len(ids) and i not in keep:
+            run.append(pk)
+            continue
+        hi = keys[pk] if pk is not None else None
+        changes.update(zip(run, keys_between(lo, hi, len(run))))
+        run, lo = [], hi
+    return changes
+
+
+def next_key(model, *criteria, column='position'):
+    """Clave para añadir un elemento al final de la lista (usa el índice para el máximo)."""
+    last = db.session.query(func.max(getattr(model, column))).filter(*criteria).scalar()
+    return key_between(last, None)
+
+
+def append_key(model, group, value, last_keys, column='position'):
+    """
+    Clave para añadir un elemento al final de la lista `group == value`.
+    `last_keys` guarda la última clave de cada lista durante una misma
+    operación, de modo que añadir varios elementos sólo consulta una vez.
+    """
+    cache_key = (model, value)
+    if cache_key not in last_keys:
+        last_keys[cache_key] = db.session.query(func.max(getattr(model, column))).filter(group == value).scalar()
+    last_keys[cache_key] = key_between(last_keys[cache_key], None)
+    return last_keys[cache_key]
+
+
+def rebalance(model, *criteria, column='position', order_by=()):
+    """
+    Reparte de nuevo las claves de toda la lista (orden actual conservado)
+    para acortarlas. Devuelve el número de filas reescritas.
+    """
+    col = getattr(model, column)
+    ids = [pk for pk, in db.session.query(model.id).filter(*criteria).order_by(col, *order_by, model.id)]
+    return apply_orders(model, dict(zip(ids, keys_between(None, None, len(ids)))), *criteria, column=column)
+
+
+def rebalance_if_needed(model, key, *criteria, column='position', order_by=()):
+    """Rebalancea la lista cuando una clave recién calculada es demasiado larga."""
+    if key is not None and len(key) > MAX_KEY_LENGTH:
+        return rebalance(model, *criteria, column=column, order_by=order_by)
+    return 0
+
+
+# ---------------------------
+# COMANDO DE MANTENIMIENTO
+# ---------------------------
+@order_cli.command('rebalance')
+@click.argument('lista', type=click.Choice(sorted(ORDERED_LISTS)))
+@click.option('--min-length', type=int, default=MAX_KEY_LENGTH // 2,
+              help='Sólo listas con alguna clave de al menos esta longitud (0 = todas).')
+def rebalance_command(lista, min_length):
+    """Redistribuye las claves de orden de las listas con claves largas."""
+    model, group = ORDERED_LISTS[lista]
+    query = db.session.query(group).distinct()
+    if min_length:
+        query = query.filter(func.length(model.position) >= min_length)
+    grupos = [valor for valor, in query]
+    filas = sum(rebalance(model, group == valor) for valor in grupos)
+    db.session.commit()
+    click.echo(f"{len(grupos)} lista(s) rebalanceada(s), {filas} fila(s) reescrita(s).")
+
+
+def init_app(app):
+    app.cli.add_command(order_cli)
@@ -0,0 +1,167 @@
+"""
+Pool de conexiones a la base de datos: configuración y métricas.
+
+`configure(app)` rellena SQLALCHEMY_ENGINE_OPTIONS a partir de las
+claves DB_* de la configuración (ver config.py) antes de que se cree
+el motor; lo que ya venga en SQLALCHEMY_ENGINE_OPTIONS tiene prioridad.
+
+- Tamaño: DB_POOL_SIZE conexiones por proceso más DB_MAX_OVERFLOW
+  temporales. gunicorn.conf.py lo iguala a los hilos de cada worker.
+- Salud (sólo servidores como Postgres): pre-ping al sacar cada
+  conexión y reciclado a los DB_POOL_RECYCLE segundos, para que tras
+  una conmutación por error no se usen conexiones muertas. Cuando el
+  pre-ping detecta una caída SQLAlchemy invalida el pool entero. Además
+  se fija un tiempo de conexión.
+- statement_timeout (Postgres): sólo en los workers web, que lo activan
+  con `limit_statements()` desde post_fork (gunicorn.conf.py). Los
+  comandos (flask db upgrade, search reindex, stats rebuild) no tienen
+  límite.
+- Espera: quien no consigue conexión en DB_POOL_TIMEOUT segundos recibe
+  un error en lugar de acumularse.
+
+El pool mide cuánto se espera al sacar una conexión, los agotamientos y
+las invalidaciones; `snapshot()` lo resume junto con la ocupación
+(GET /api/metrics/pool, con METRICS_TOKEN). Las métricas son de cada
+proceso.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event, exc, make_url
+from sqlalchemy.pool import QueuePool
+
+from app.db import db
+
+
+class _Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.espera_total = 0.0
+            self.espera_max = 0.0
+            self.agotados = 0
+            self.conexiones = 0
+            self.invalidadas = 0
+
+    def espera(self, segundos, agotado=False):
+        with self._lock:
+            self.checkouts += not agotado
+            self.agotados += agotado
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+
+    def contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+
+metricas = _Metricas()
+
+# Milisegundos de statement_timeout de las conexiones nuevas (None = sin límite)
+_limite_sentencias = None
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que mide la espera al sacar conexiones (incluye abrirlas si hace falta)."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except exc.TimeoutError:
+            metricas.espera(time.perf_counter() - inicio, agotado=True)
+            raise
+        metricas.espera(time.perf_counter() - inicio)
+        return conexion
+
+
+def engine_options(config):
+    """Opciones del motor para la URI configurada (vacías para SQLite en memoria)."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    servidor = url.get_backend_name() != 'sqlite'
+    if not servidor and url.database in (None, '', ':memory:'):
+        return {}  # Flask-SQLAlchemy usa StaticPool: una sola conexión compartida
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+    }
+    if servidor:
+        options.update(pool_pre_ping=True, pool_recycle=config.get('DB_POOL_RECYCLE', 1800))
+    if url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 5)}
+    return options
+
+
+def snapshot():
+    """Estado del pool de este proceso y métricas acumuladas."""
+    pool = db.engine.pool
+    datos = {'pid': os.getpid(), 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        capacidad = pool.size() + pool._max_overflow
+        datos.update(
+            size=pool.size(),
+            max_overflow=pool._max_overflow,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            saturation=round(pool.checkedout() / capacidad, 3) if capacidad > 0 else None,
+        )
+    with metricas._lock:
+        intentos = metricas.checkouts + metricas.agotados
+        datos.update(
+            checkouts=metricas.checkouts,
+            wait_ms_avg=round(metricas.espera_total * 1000 / intentos, 3) if intentos else 0.0,
+            wait_ms_max=round(metricas.espera_max * 1000, 3),
+            timeouts=metricas.agotados,
+            connects=metricas.conexiones,
+            invalidations=metricas.invalidadas,
+        )
+    return datos
+
+
+def configure(app):
+    """Se llama antes de db.init_app: completa SQLALCHEMY_ENGINE_OPTIONS."""
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for clave, valor in engine_options(app.config).items():
+        options.setdefault(clave, valor)
+
+
+def limit_statements(app):
+    """
+    Activa DB_STATEMENT_TIMEOUT en este proceso (sólo Postgres) y vacía
+    el pool para que todas las conexiones lo lleven.
+    """
+    global _limite_sentencias
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'postgresql' and app.config.get('DB_STATEMENT_TIMEOUT'):
+        _limite_sentencias = int(app.config['DB_STATEMENT_TIMEOUT'])
+    engine.dispose(close=False)
+
+
+def init_app(app):
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'connect', _on_connect):
+        event.listen(engine, 'connect', _on_connect)
+        event.listen(engine, 'invalidate', _on_invalidate)
+
+
+def _on_connect(dbapi_connection, connection_record):
+    metricas.contar('conexiones')
+    if _limite_sentencias:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {_limite_sentencias}")
+        cursor.close()
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    metricas.contar('invalidadas')
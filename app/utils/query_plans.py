@@ -0,0 +1,133 @@
+"""
+Comprobación de planes de ejecución de las consultas calientes.
+
+`flask plans check` pide al motor el plan de cada consulta registrada
+y falla (código de salida 1) si alguna recorre una tabla completa en
+lugar de usar un índice. En SQLite se usa EXPLAIN QUERY PLAN; en
+Postgres, EXPLAIN con `enable_seqscan` desactivado para comprobar que
+existe un índice utilizable aunque la tabla sea pequeña.
+"""
+import json
+import re
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select
+
+from app.db import db
+from app.models import (
+    Category, DiarioApartado, DiarioCategoria, DiarioSubcategoria, DiarioTema,
+    Event, Goal, Subtask, Task, TaskTombstone, Template,
+)
+from app.utils.diario import notas_query
+from app.utils.recurrence import window_statement
+from app.utils.serializers import GOAL
+
+plans_cli = AppGroup('plans', help='Planes de ejecución de las consultas calientes.')
+
+_SCAN_SQLITE = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)')
+
+
+def hot_queries(user_id):
+    """Consultas que ejecutan las rutas más usadas, con el mismo filtro que usan ellas."""
+    hoy = date.today()
+    return {
+        'GET /api/events (rango)': select(Task).where(
+            Task.user_id == user_id,
+            Task.start <= hoy + timedelta(days=41),
+            Task.end_effective >= hoy,
+        ),
+        'GET /api/events (subtareas)': select(Subtask.id, Subtask.task_id, Subtask.text, Subtask.done).where(
+            Subtask.task_id.in_([1, 2, 3])
+        ),
+        'GET /api/events/changes': select(Task).where(Task.user_id == user_id, Task.change_seq > 0),
+        'GET /api/events/changes (borrados)': select(TaskTombstone.entity, TaskTombstone.entity_id).where(
+            TaskTombstone.user_id == user_id, TaskTombstone.change_seq > 0
+        ),
+        'panel (tareas completadas)': select(func.count(Task.id)).where(
+            Task.user_id == user_id, Task.completed == True  # noqa: E712
+        ),
+        'panel (eventos próximos)': select(func.count(Event.id)).where(
+            Event.user_id == user_id, Event.start >= datetime.utcnow()
+        ),
+        'GET /api/week': window_statement(user_id, hoy, hoy + timedelta(days=6)),
+        'GET /api/templates': select(Template).where(Template.user_id == user_id),
+        'GET /api/goals': select(*GOAL.columns()).outerjoin(Category, Goal.category_id == Category.id)
+        .where(Goal.user_id == user_id).order_by(Goal.position.asc(), Goal.created_at.desc()),
+        'GET /api/categories': select(Category).where(Category.user_id == user_id),
+        'GET /api/diario (notas)': select(DiarioApartado).where(DiarioApartado.user_id == user_id).order_by(
+            DiarioApartado.position, DiarioApartado.id
+        ),
+        'GET /api/diario (temas)': select(DiarioTema).where(DiarioTema.user_id == user_id).order_by(
+            DiarioTema.position, DiarioTema.id
+        ),
+        'GET /api/diario (categorías)': select(DiarioCategoria).join(DiarioTema).where(
+            DiarioTema.user_id == user_id
+        ).order_by(DiarioCategoria.tema_id, DiarioCategoria.position, DiarioCategoria.id),
+        'GET /api/diario (subcategorías)': select(DiarioSubcategoria).join(DiarioCategoria).join(DiarioTema).where(
+            DiarioTema.user_id == user_id
+        ).order_by(DiarioSubcategoria.categoria_id, DiarioSubcategoria.position, DiarioSubcategoria.id),
+        'GET /api/diario/tree (notas)': notas_query(user_id).statement,
+        'GET /api/diario/notas (tema)': notas_query(user_id, 'tema:1', extracto=True).statement,
+    }
+
+
+def _sql(connection, stmt):
+    return str(stmt.compile(
+        dialect=connection.dialect,
+        compile_kwargs={'literal_binds': True, 'render_postcompile': True},
+    ))
+
+
+def _scans_sqlite(connection, sql):
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+    return [row[-1] for row in rows if _SCAN_SQLITE.match(row[-1])]
+
+
+def _scans_postgres(connection, sql):
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    pendientes = [plan[0]['Plan']]
+    while pendientes:
+        nodo = pendientes.pop()
+        if nodo.get('Node Type') == 'Seq Scan':
+            scans.append(f"Seq Scan on {nodo.get('Relation Name')}")
+        pendientes.extend(nodo.get('Plans', []))
+    return scans
+
+
+def full_scans(connection, stmt):
+    """Devuelve los recorridos completos de tabla que aparecen en el plan de `stmt`."""
+    sql = _sql(connection, stmt)
+    if connection.dialect.name == 'sqlite':
+        return _scans_sqlite(connection, sql)
+    if connection.dialect.name == 'postgresql':
+        return _scans_postgres(connection, sql)
+    raise click.ClickException(f"Dialecto no soportado: {connection.dialect.name}")
+
+
+@plans_cli.command('check')
+@click.option('--user-id', type=int, default=1, help='Usuario con el que se parametrizan las consultas.')
+def check_command(user_id):
+    """Falla si alguna consulta caliente hace un recorrido completo de tabla."""
+    fallos = 0
+    with db.engine.connect() as connection:
+        for nombre, stmt in hot_queries(user_id).items():
+            with connection.begin():
+                scans = full_scans(connection, stmt)
+            if scans:
+                fallos += 1
+                click.echo(f"SCAN  {nombre}: {'; '.join(scans)}")
+            else:
+                click.echo(f"OK    {nombre}")
+    if fallos:
+        raise click.ClickException(f"{fallos} consulta(s) recorren tablas completas.")
+
+
+def init_app(app):
+    app.cli.add_command(plans_cli)
@@ -0,0 +1,242 @@
+"""
+Motor de recurrencia del horario semanal (ScheduleTask).
+
+La ventana se filtra en SQL: tareas no recurrentes cuya fecha cae en la
+ventana, más reglas recurrentes cuyo intervalo [date, end_date] se
+solapa con ella (las reglas sin end_date no terminan nunca). Las
+ocurrencias se calculan aritméticamente para cada regla (diaria,
+semanal o mensual) sin recorrer la ventana día a día.
+
+También expande en el servidor las RRULE de las tareas del calendario
+(Task.rrule_text), con una caché de ocurrencias por tarea y ventana.
+Las reglas con frecuencia inferior al día se rechazan al guardarlas, y
+la expansión está acotada en días de ventana (RRULE_MAX_WINDOW_DAYS) y
+en ocurrencias por tarea (RRULE_MAX_OCCURRENCES): al superarlas se lanza
+`RecurrenceLimitError` en lugar de generar una respuesta enorme.
+"""
+from calendar import monthrange
+from datetime import date, datetime, time, timedelta
+from itertools import islice, takewhile
+
+from dateutil.rrule import DAILY, rrulestr
+from flask import current_app
+from sqlalchemy import and_, event, or_, select, union_all
+
+from app.db import db
+from app.models import ScheduleTask, Task
+from app.utils.cache import TTLCache
+from app.utils.serializers import SCHEDULE_TASK
+
+RECURRENCIAS = ('daily', 'weekly', 'monthly')
+
+
+def occurrences(recurrence, first, until, window_start, window_end):
+    """
+    Fechas en las que cae una regla dentro de [window_start, window_end].
+    `first` es el primer día de la regla y `until` el último (o None).
+    """
+    lo = max(first, window_start)
+    hi = window_end if until is None else min(until, window_end)
+    if lo > hi:
+        return []
+
+    if recurrence == 'daily':
+        return [lo + timedelta(days=i) for i in range((hi - lo).days + 1)]
+
+    if recurrence == 'weekly':
+        lo += timedelta(days=(first.weekday() - lo.weekday()) % 7)
+        if lo > hi:
+            return []
+        return [lo + timedelta(weeks=i) for i in range((hi - lo).days // 7 + 1)]
+
+    if recurrence == 'monthly':
+        result = []
+        year, month = lo.year, lo.month
+        while (year, month) <= (hi.year, hi.month):
+            # Los meses sin ese día (p. ej. 31) no tienen ocurrencia
+            if first.day <= monthrange(year, month)[1]:
+                day = date(year, month, first.day)
+                if lo <= day <= hi:
+                    result.append(day)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return result
+
+    return []
+
+
+def is_recurring(task):
+    """Regla recurrente válida; sin `end_date` se repite indefinidamente."""
+    return task.recurrence in RECURRENCIAS
+
+
+def window_statement(user_id, start, end, *columns):
+    """
+    Tareas del usuario visibles en [start, end], como unión de tres ramas
+    que se resuelven cada una con un rango de índice:
+
+    - puntuales con fecha en la ventana: (user_id, date)
+    - reglas con fin posterior al inicio de la ventana: (user_id, recurrence, end_date)
+    - reglas abiertas (end_date nulo): ídem
+
+    Las dos últimas sólo leen reglas recurrentes activas, nunca el
+    historial de tareas puntuales; las que empiezan después de la
+    ventana no generan ocurrencias al expandir. Con `columns` se
+    seleccionan sólo esas columnas en lugar de la entidad.
+    """
+    puntuales = select(ScheduleTask.id).where(
+        ScheduleTask.user_id == user_id,
+        ScheduleTask.date >= start,
+        ScheduleTask.date <= end,
+        or_(
+            ScheduleTask.recurrence == 'none',
+            and_(
+                ScheduleTask.end_date.is_(None),
+                or_(ScheduleTask.recurrence.is_(None), ScheduleTask.recurrence.notin_(RECURRENCIAS)),
+            ),
+        ),
+    )
+    con_fin = select(ScheduleTask.id).where(
+        ScheduleTask.user_id == user_id,
+        ScheduleTask.recurrence.in_(RECURRENCIAS),
+        ScheduleTask.end_date >= start,
+    )
+    abiertas = select(ScheduleTask.id).where(
+        ScheduleTask.user_id == user_id,
+        ScheduleTask.recurrence.in_(RECURRENCIAS),
+        ScheduleTask.end_date.is_(None),
+    )
+    ids = union_all(puntuales, con_fin, abiertas).subquery()
+    return select(*(columns or [ScheduleTask])).where(ScheduleTask.id.in_(select(ids.c.id))).order_by(ScheduleTask.id)
+
+
+def expand_window(user_id, start, end):
+    """Devuelve los dicts que consume el cliente para la ventana, ya expandidos."""
+    tasks = db.session.execute(window_statement(user_id, start, end, *SCHEDULE_TASK.columns()))
+
+    tasks_list = []
+    for t in tasks:
+        if not is_recurring(t):
+            tasks_list.append(SCHEDULE_TASK(t))
+            continue
+        base = SCHEDULE_TASK(t)
+        for day in occurrences(t.recurrence, t.date, t.end_date, start, end):
+            tasks_list.append(dict(
+                base,
+                id=f"{t.id}-{day.strftime('%Y%m%d')}",  # id único por ocurrencia
+                date=day.isoformat(),
+                recurrence="none",  # ya no recurrente para cliente
+            ))
+    return tasks_list
+
+
+# ---------------------------
+# RRULE DE TAREAS (Task.rrule_text)
+# ---------------------------
+_rrule_cache = TTLCache(maxsize=4096, ttl=3600)
+
+
+class RecurrenceLimitError(ValueError):
+    """La expansión pedida supera los límites configurados."""
+
+
+def has_rrule(task):
+    return bool(task.rrule_text and task.rrule_text.strip())
+
+
+def validate_rrule(rrule_text):
+    """
+    Rechaza (ValueError) las reglas con frecuencia inferior al día. Las
+    que no se pueden interpretar se admiten y se tratan como tarea sin
+    repetición al expandir.
+    """
+    if rrule_text is None:
+        return
+    if not isinstance(rrule_text, str):
+        raise ValueError("Recurrencia inválida")
+    if not rrule_text.strip():
+        return
+    try:
+        rule = rrulestr(rrule_text, dtstart=datetime(2000, 1, 1), ignoretz=True, forceset=True)
+    except (ValueError, TypeError):
+        return
+    # FREQ: YEARLY=0 ... DAILY=3, HOURLY=4, MINUTELY=5, SECONDLY=6
+    if any(r._freq > DAILY for r in rule._rrule):
+        raise ValueError("La recurrencia no puede ser inferior a un día")
+
+
+def check_window(window_start, window_end):
+    """Lanza RecurrenceLimitError si la ventana es más larga de lo permitido."""
+    max_days = current_app.config.get('RRULE_MAX_WINDOW_DAYS', 400)
+    if (window_end - window_start).days > max_days:
+        raise RecurrenceLimitError(f"El rango no puede superar {max_days} días al expandir")
+
+
+def rrule_occurrences(task_id, rrule_text, dtstart, window_start, window_end, span_days=0):
+    """
+    Fechas de inicio de las ocurrencias de una RRULE que tocan
+    [window_start, window_end]. `span_days` es la duración de cada
+    ocurrencia, para incluir las que empiezan antes y terminan dentro.
+    El resultado se cachea por (tarea, regla, inicio, ventana).
+
+    Se dejan de generar fechas al pasar de RRULE_MAX_OCCURRENCES y en
+    ese caso se lanza RecurrenceLimitError.
+    """
+    key = (task_id, rrule_text, dtstart, window_start, window_end, span_days)
+    cached = _rrule_cache.get(key)
+    if cached is not None:
+        return cached
+
+    max_occurrences = current_app.config.get('RRULE_MAX_OCCURRENCES', 1000)
+    try:
+        rule = rrulestr(rrule_text, dtstart=datetime.combine(dtstart, time.min), ignoretz=True)
+        desde = datetime.combine(window_start - timedelta(days=span_days), time.min)
+        hasta = datetime.combine(window_end, time.min)
+        en_ventana = takewhile(lambda dt: dt <= hasta, rule.xafter(desde, inc=True))
+        result = tuple(dt.date() for dt in islice(en_ventana, max_occurrences + 1))
+    except (ValueError, TypeError):
+        # Regla no válida: se trata como tarea sin repetición
+        result = (dtstart,) if window_start - timedelta(days=span_days) <= dtstart <= window_end else ()
+    if len(result) > max_occurrences:
+        raise RecurrenceLimitError(
+            f"La tarea {task_id} tiene más de {max_occurrences} ocurrencias en el rango"
+        )
+
+    _rrule_cache.set(key, result)
+    return result
+
+
+def expand_task(serialized, task, window_start, window_end, fields=None):
+    """
+    Convierte una tarea serializada con RRULE en sus ocurrencias dentro
+    de la ventana. Con `fields` cada ocurrencia se limita a esos campos.
+    """
+    span = (task.end - task.start).days if task.end else 0
+    expanded = []
+    for day in rrule_occurrences(task.id, task.rrule_text, task.start, window_start, window_end, span):
+        data = dict(
+            serialized,
+            start=day.isoformat(),
+            end=(day + timedelta(days=span)).isoformat() if task.end else None,
+            occurrence=day.isoformat(),
+            rruleText=None,  # ya expandida: el cliente no debe repetirla
+        )
+        if fields is not None:
+            data = {name: value for name, value in data.items() if name in fields}
+        expanded.append(data)
+    return expanded
+
+
+def invalidate_rrule(task_id):
+    """Olvida las ocurrencias cacheadas de una tarea."""
+    _rrule_cache.pop_where(lambda key: key[0] == task_id)
+
+
+def _after_flush(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Task) and obj.id is not None:
+            invalidate_rrule(obj.id)
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
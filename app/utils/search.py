@@ -0,0 +1,278 @@
+"""
+Búsqueda de texto completo en notas del diario, metas, tareas y horario.
+
+Cada elemento buscable tiene una fila en `search_documents` (usuario,
+tipo, id, título y cuerpo) que se rehace en el mismo flush que lo
+escribe. El índice de texto depende del motor:
+
+- SQLite: tabla FTS5 `search_fts` de contenido externo sobre
+  search_documents, sincronizada con triggers; se ordena por bm25.
+- Postgres: columna generada `tsv` (título con peso A, cuerpo con
+  peso B) con índice GIN; se ordena por ts_rank_cd.
+
+Las notas se pueden filtrar por su ubicación en el diario (`place`,
+como en app/utils/diario.py: root, tema:id, categoria:id o
+subcategoria:id) en la misma consulta.
+
+Las subtareas se indexan dentro del documento de su tarea. Los borrados
+en bloque (Query.delete) no pasan por el flush: quien los haga debe
+llamar a `forget`. `flask search reindex` lo reconstruye todo.
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import DDL, bindparam, delete, event, insert, inspect, select, text
+
+from app.db import db
+from app.models import DiarioApartado, Goal, ScheduleTask, SearchDocument, Subtask, Task
+
+search_cli = AppGroup('search', help='Índice de búsqueda de texto completo.')
+
+KINDS = ('nota', 'meta', 'tarea', 'horario')
+INDEX_BATCH_SIZE = 500
+MAX_TERMS = 8
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Modelo -> (tipo de documento, atributos cuyo cambio obliga a reindexar)
+FUENTES = {
+    DiarioApartado: ('nota', ('contenido', 'user_id')),
+    Goal: ('meta', ('description', 'user_id')),
+    Task: ('tarea', ('title', 'user_id')),
+    Subtask: ('tarea', ('text', 'task_id')),
+    ScheduleTask: ('horario', ('title', 'description', 'user_id')),
+}
+
+# --- Estructuras propias de cada motor (también las crea create_all) ---
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE search_fts USING fts5("
+    "title, body, content='search_documents', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+POSTGRES_DDL = [
+    "ALTER TABLE search_documents ADD COLUMN tsv tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED",
+    "CREATE INDEX ix_search_documents_tsv ON search_documents USING gin (tsv)",
+]
+_DDL = [DDL(sql).execute_if(dialect='sqlite') for sql in SQLITE_DDL] + \
+    [DDL(sql).execute_if(dialect='postgresql') for sql in POSTGRES_DDL]
+
+_BUSCAR = {
+    'sqlite': """
+        SELECT d.kind, d.entity_id, d.title,
+               snippet(search_fts, 1, '', '', '…', 16) AS snippet,
+               -bm25(search_fts, 4.0, 1.0) AS score
+        FROM search_fts JOIN search_documents AS d ON d.id = search_fts.rowid
+        WHERE search_fts MATCH :consulta AND d.user_id = :user_id AND d.kind IN :kinds{filtro}
+        ORDER BY bm25(search_fts, 4.0, 1.0), d.id
+        LIMIT :limit OFFSET :offset
+    """,
+    # El extracto se calcula sólo para la página, no para todas las coincidencias
+    'postgresql': """
+        SELECT kind, entity_id, title,
+               ts_headline('simple', body, consulta,
+                           'StartSel="",StopSel="",MaxWords=24,MinWords=8') AS snippet,
+               score
+        FROM (
+            SELECT d.id, d.kind, d.entity_id, d.title, d.body, q.consulta,
+                   ts_rank_cd(d.tsv, q.consulta) AS score
+            FROM search_documents AS d, to_tsquery('simple', :consulta) AS q(consulta)
+            WHERE d.tsv @@ q.consulta AND d.user_id = :user_id AND d.kind IN :kinds{filtro}
+            ORDER BY score DESC, d.id
+            LIMIT :limit OFFSET :offset
+        ) AS pagina
+        ORDER BY score DESC, id
+    """,
+}
+
+# Ubicación de una nota -> condición sobre su fila de diario_apartados
+_LUGARES = {
+    'root': "a.tema_id IS NULL AND a.categoria_id IS NULL AND a.subcategoria_id IS NULL",
+    'tema': "a.tema_id = :lugar",
+    'categoria': "a.categoria_id = :lugar",
+    'subcategoria': "a.subcategoria_id = :lugar",
+}
+
+
+@lru_cache(maxsize=16)
+def _sentencia(dialecto, lugar=None):
+    """Consulta de búsqueda del motor, con el filtro de ubicación si se pide."""
+    filtro = ''
+    if lugar:
+        filtro = (
+            " AND d.kind = 'nota' AND EXISTS (SELECT 1 FROM diario_apartados AS a"
+            f" WHERE a.id = d.entity_id AND {_LUGARES[lugar]})"
+        )
+    return text(_BUSCAR[dialecto].format(filtro=filtro)).bindparams(bindparam('kinds', expanding=True))
+
+
+def _lugar(place):
+    """'all' o vacío -> (None, None); 'root'; 'tema:3' -> ('tema', 3). ValueError si no es válida."""
+    if not place or place == 'all':
+        return None, None
+    if place == 'root':
+        return 'root', None
+    tipo, _, ref = place.partition(':')
+    if tipo not in _LUGARES or not ref.isdigit():
+        raise ValueError(f"Ubicación inválida: {place!r}")
+    return tipo, int(ref)
+
+_PALABRA = re.compile(r'\w+')
+
+
+def _consulta(dialecto, q):
+    """Texto del usuario -> consulta del motor: todas las palabras, como prefijo."""
+    terminos = _PALABRA.findall((q or '').lower())[:MAX_TERMS]
+    if not terminos:
+        return None
+    if dialecto == 'postgresql':
+        return ' & '.join(f"{t}:*" for t in terminos)
+    return ' '.join(f'"{t}"*' for t in terminos)
+
+
+def search(user_id, q, kinds=KINDS, limit=PAGE_SIZE, offset=0, place=None):
+    """
+    Resultados del usuario ordenados por relevancia:
+    (lista de {kind, id, title, snippet, score}, offset siguiente o None).
+    Con `place` sólo se devuelven notas de esa ubicación del diario
+    (ValueError si no es válida).
+    """
+    lugar, ref = _lugar(place)
+    connection = db.session.connection()
+    dialecto = connection.dialect.name
+    consulta = _consulta(dialecto, q)
+    if consulta is None or not kinds or dialecto not in _BUSCAR:
+        return [], None
+    filas = connection.execute(_sentencia(dialecto, lugar), {
+        'consulta': consulta, 'user_id': user_id, 'kinds': list(kinds),
+        'limit': limit + 1, 'offset': offset, 'lugar': ref,
+    }).all()
+    siguiente = offset + limit if len(filas) > limit else None
+    return [
+        {'kind': f.kind, 'id': f.entity_id, 'title': f.title, 'snippet': f.snippet, 'score': float(f.score)}
+        for f in filas[:limit]
+    ], siguiente
+
+
+# --- Documentos desde las tablas de origen ---
+def _notas(connection, ids):
+    for f in connection.execute(
+        select(DiarioApartado.id, DiarioApartado.user_id, DiarioApartado.titulo, DiarioApartado.contenido)
+        .where(DiarioApartado.id.in_(ids))
+    ):
+        yield f.user_id, f.id, f.titulo, f.contenido
+
+
+def _metas(connection, ids):
+    for f in connection.execute(select(Goal.id, Goal.user_id, Goal.description).where(Goal.id.in_(ids))):
+        yield f.user_id, f.id, f.description, ''
+
+
+def _tareas(connection, ids):
+    textos = defaultdict(list)
+    for task_id, texto in connection.execute(
+        select(Subtask.task_id, Subtask.text).where(Subtask.task_id.in_(ids))
+        .order_by(Subtask.task_id, Subtask.order, Subtask.id)
+    ):
+        textos[task_id].append(texto)
+    for f in connection.execute(
+        select(Task.id, Task.user_id, Task.title).where(Task.id.in_(ids), Task.user_id.isnot(None))
+    ):
+        yield f.user_id, f.id, f.title, '\n'.join(textos[f.id])
+
+
+def _horario(connection, ids):
+    for f in connection.execute(
+        select(ScheduleTask.id, ScheduleTask.user_id, ScheduleTask.title, ScheduleTask.description)
+        .where(ScheduleTask.id.in_(ids))
+    ):
+        yield f.user_id, f.id, f.title, f.description or ''
+
+
+DOCUMENTOS = {'nota': _notas, 'meta': _metas, 'tarea': _tareas, 'horario': _horario}
+
+
+def index(connection, kind, ids):
+    """Rehace los documentos de esos elementos (los que ya no existen desaparecen)."""
+    ids = sorted(ids)
+    tabla = SearchDocument.__table__
+    for i in range(0, len(ids), INDEX_BATCH_SIZE):
+        lote = ids[i:i + INDEX_BATCH_SIZE]
+        connection.execute(delete(tabla).where(tabla.c.kind == kind, tabla.c.entity_id.in_(lote)))
+        filas = [
+            {'user_id': user_id, 'kind': kind, 'entity_id': entity_id,
+             'title': (title or '')[:250], 'body': body or ''}
+            for user_id, entity_id, title, body in DOCUMENTOS[kind](connection, lote)
+        ]
+        if filas:
+            connection.execute(insert(tabla), filas)
+
+
+def forget(user_id, kind):
+    """Quita del índice todos los documentos de un tipo del usuario (borrados en bloque)."""
+    tabla = SearchDocument.__table__
+    db.session.execute(delete(tabla).where(tabla.c.user_id == user_id, tabla.c.kind == kind))
+
+
+def _after_flush(session, flush_context):
+    pendientes = defaultdict(set)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        fuente = FUENTES.get(type(obj))
+        if not fuente:
+            continue
+        kind, campos = fuente
+        state = inspect(obj)
+        if obj in session.dirty and obj not in session.deleted \
+                and not any(state.attrs[c].history.has_changes() for c in campos):
+            continue
+        if isinstance(obj, Subtask):
+            # Al cambiar de tarea se reindexan la anterior y la nueva
+            anteriores = state.attrs.task_id.history.deleted or ()
+            pendientes[kind].update(t for t in (obj.task_id, *anteriores) if t is not None)
+        elif obj.id is not None:
+            pendientes[kind].add(obj.id)
+
+    if pendientes:
+        connection = session.connection()
+        for kind, ids in pendientes.items():
+            index(connection, kind, ids)
+
+
+# ---------------------------
+# COMANDO DE REPARACIÓN
+# ---------------------------
+@search_cli.command('reindex')
+@click.option('--kind', type=click.Choice(KINDS), default=None, help='Reindexar sólo este tipo.')
+def reindex_command(kind):
+    """Reconstruye el índice de búsqueda desde las tablas de origen."""
+    connection = db.session.connection()
+    modelos = {k: m for m, (k, _) in FUENTES.items() if m is not Subtask}
+    for k in ([kind] if kind else KINDS):
+        tabla = SearchDocument.__table__
+        connection.execute(delete(tabla).where(tabla.c.kind == k))
+        ids = connection.execute(select(modelos[k].id)).scalars().all()
+        index(connection, k, ids)
+        click.echo(f"{k}: {len(ids)} elemento(s)")
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO search_fts(search_fts) VALUES ('optimize')"))
+    db.session.commit()
+
+
+def init_app(app):
+    for ddl in _DDL:
+        if not event.contains(SearchDocument.__table__, 'after_create', ddl):
+            event.listen(SearchDocument.__table__, 'after_create', ddl)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+    app.cli.add_command(search_cli)
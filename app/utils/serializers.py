@@ -0,0 +1,166 @@
+"""
+Serializadores de los modelos: el formato JSON que espera el cliente.
+
+Cada modelo registra una sola vez sus campos (nombre en el JSON ->
+columna y conversión). El mismo serializador sirve para objetos ORM y
+para filas de consultas que seleccionan sólo `columns()`, así que los
+listados no necesitan hidratar objetos. Para cada combinación de campos
+se prepara una vez la lista de (nombre, atributo, conversión).
+
+También define el proveedor JSON de la app, que usa orjson cuando está
+instalado y, si no, el codificador estándar de Flask.
+"""
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.models import Category, Event, Goal, ScheduleTask, Subtask, Task, Template
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+class Serializer:
+    def __init__(self, fields):
+        self.fields = fields
+        self.names = frozenset(fields)
+
+    def columns(self, names=None):
+        """Columnas que hay que seleccionar para esos campos (todos por defecto)."""
+        return [column for _, column, _ in self._plan(names)]
+
+    @lru_cache(maxsize=64)
+    def _plan(self, names):
+        return tuple(
+            (name, column, convert)
+            for name, (column, convert) in self.fields.items()
+            if names is None or name in names
+        )
+
+    def __call__(self, obj, names=None):
+        data = {}
+        for name, column, convert in self._plan(names):
+            value = getattr(obj, column.key)
+            data[name] = convert(value) if convert is not None and value is not None else value
+        return data
+
+    def many(self, rows, names=None):
+        return [self(row, names) for row in rows]
+
+
+_registry = {}
+
+
+def register(model, fields):
+    _registry[model] = Serializer(fields)
+    return _registry[model]
+
+
+def serializer(model):
+    return _registry[model]
+
+
+def serialize(obj, names=None):
+    return _registry[type(obj)](obj, names)
+
+
+TASK = register(Task, {
+    'id': (Task.id, None),
+    'title': (Task.title, None),
+    'start': (Task.start, _iso),
+    'end': (Task.end, _iso),
+    'priority': (Task.priority, None),
+    'tag': (Task.tag, None),
+    'tagColor': (Task.tag_color, None),
+    'completed': (Task.completed, None),
+    'rruleText': (Task.rrule_text, None),
+})
+
+SUBTASK = register(Subtask, {
+    'id': (Subtask.id, None),
+    'text': (Subtask.text, None),
+    'done': (Subtask.done, None),
+})
+
+SCHEDULE_TASK = register(ScheduleTask, {
+    'id': (ScheduleTask.id, None),
+    'title': (ScheduleTask.title, None),
+    'description': (ScheduleTask.description, None),
+    'date': (ScheduleTask.date, _iso),
+    'endDate': (ScheduleTask.end_date, _iso),
+    'startHour': (ScheduleTask.start_hour, None),
+    'duration': (ScheduleTask.duration, None),
+    'completed': (ScheduleTask.completed, None),
+    'inProgress': (ScheduleTask.in_progress, None),
+    'color': (ScheduleTask.color, None),
+    'recurrence': (ScheduleTask.recurrence, None),
+})
+
+TEMPLATE = register(Template, {
+    'id': (Template.id, None),
+    'title': (Template.title, None),
+    'description': (Template.description, None),
+    'duration': (Template.duration, None),
+    'color': (Template.color, None),
+    'recurrence': (Template.recurrence, None),
+})
+
+# `category_name` sale de la categoría: en las consultas por columnas hay
+# que unir Category; en los objetos lo da la propiedad Goal.category_name
+GOAL = register(Goal, {
+    'id': (Goal.id, None),
+    'description': (Goal.description, None),
+    'category_id': (Goal.category_id, None),
+    'category_name': (Category.name.label('category_name'), None),
+    'completed': (Goal.completed, None),
+    'created_at': (Goal.created_at, _iso),
+    'due_date': (Goal.due_date, _iso),
+    'order': (Goal.order, None),
+    'position': (Goal.position, None),
+})
+
+EVENT = register(Event, {
+    'id': (Event.id, None),
+    'title': (Event.title, None),
+    'start': (Event.start, _iso),
+    'end': (Event.end, _iso),
+    'priority': (Event.priority, None),
+    'status': (Event.status, None),
+    'tag': (Event.tag, None),
+    'tag_color': (Event.tag_color, None),
+    'recurrence_rule': (Event.recurrence_rule, None),
+})
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Igual que el proveedor por defecto pero codifica con orjson si está
+    disponible. Las fechas se siguen pasando por `default` para que el
+    resultado no cambie; con opciones propias (p. ej. indent) se usa json.
+    """
+
+    def dumps(self, obj, **kwargs):
+        # `separators` compactos es lo que pasa response(); orjson ya escribe así
+        compacto = kwargs.get('separators', (',', ':')) == (',', ':')
+        if orjson is None or not compacto or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def init_app(app):
+    if app.config.get('FAST_JSON', True):
+        app.json = FastJSONProvider(app)
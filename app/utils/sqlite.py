@@ -0,0 +1,129 @@
+"""
+Perfil de rendimiento para SQLite (instalaciones de un solo nodo).
+
+Al abrir cada conexión se configura:
+- journal_mode=WAL: los lectores no esperan a los escritores (sólo
+  bases en fichero; en memoria no aplica).
+- synchronous=NORMAL: con WAL es seguro ante caídas del proceso y evita
+  un fsync por transacción.
+- busy_timeout: un escritor espera a que el otro termine en lugar de
+  fallar en el acto con "database is locked".
+- cache_size y mmap_size: páginas en memoria por conexión y lectura
+  mapeada del fichero.
+
+Con SQLITE_WRITE_LOCK las peticiones que modifican datos (POST, PUT,
+PATCH, DELETE) pasan de una en una entre todos los workers, mediante un
+cerrojo de fichero junto a la base de datos. SQLite sólo admite un
+escritor a la vez: así esperan en cola en lugar de competir por el
+bloqueo y agotar busy_timeout. Sin fcntl (Windows) el cerrojo sólo
+ordena los hilos de cada proceso.
+"""
+import os
+import threading
+import time
+
+from flask import abort, g, request
+from sqlalchemy import event, make_url
+
+from app.db import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MUTACIONES = {'POST', 'PUT', 'PATCH', 'DELETE'}
+# El hash de contraseñas es lento y sus escrituras son pocas: confían en busy_timeout
+EXENTOS = {'auth'}
+
+
+def _ruta_fichero(url):
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+
+class WriteLock:
+    """Cerrojo de escritura compartido por hilos y procesos (fichero `<db>.lock`)."""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self._hilos = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def _fichero(self):
+        # Un descriptor por proceso: flock no distingue entre hilos del mismo
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self):
+        limite = time.monotonic() + self.timeout
+        if not self._hilos.acquire(timeout=self.timeout):
+            return False
+        if fcntl is None:
+            return True
+        while True:
+            try:
+                fcntl.flock(self._fichero(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= limite:
+                    self._hilos.release()
+                    return False
+                time.sleep(0.005)
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self._fichero(), fcntl.LOCK_UN)
+        self._hilos.release()
+
+
+def _pragmas(config, wal):
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT', 5000))}",
+        f"PRAGMA cache_size = -{int(config.get('SQLITE_CACHE_SIZE_KB', 20000))}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if wal:
+        pragmas += [
+            "PRAGMA journal_mode = WAL",
+            "PRAGMA synchronous = NORMAL",
+            f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        ]
+    return pragmas
+
+
+def init_app(app):
+    if make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'sqlite':
+        return
+    with app.app_context():
+        engine = db.engine
+    fichero = _ruta_fichero(engine.url)
+    pragmas = _pragmas(app.config, wal=fichero is not None and app.config.get('SQLITE_WAL', True))
+
+    @event.listens_for(engine, 'connect')
+    def _configurar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    if fichero is None or not app.config.get('SQLITE_WRITE_LOCK'):
+        return
+    cerrojo = WriteLock(fichero + '.lock', app.config.get('SQLITE_WRITE_LOCK_TIMEOUT', 10))
+
+    @app.before_request
+    def _entrar_escritura():
+        if request.method in MUTACIONES and request.blueprint not in EXENTOS:
+            if not cerrojo.acquire():
+                abort(503, description="Servidor ocupado, inténtalo de nuevo")
+            g._escritura_sqlite = True
+
+    @app.teardown_request
+    def _salir_escritura(exc):
+        if g.pop('_escritura_sqlite', False):
+            cerrojo.release()
@@ -0,0 +1,198 @@
+"""
+Estadísticas materializadas por usuario (tabla `user_stats`).
+
+Cada flush que crea, modifica o borra tareas o metas aplica los
+incrementos correspondientes sobre la fila del usuario dentro de la
+misma transacción, así que el panel sólo tiene que leer una fila.
+Si la fila no existe o no se puede saber el valor anterior de un
+campo, se recalcula desde las tablas base.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, event, func, inspect, insert, select, update
+
+from app.db import db
+from app.models import Goal, Task, User, UserStats
+
+# Modelo -> (columna de total, columna de completadas)
+_CAMPOS = {
+    Task: ('total_tasks', 'done_tasks'),
+    Goal: ('total_goals', 'done_goals'),
+}
+
+stats_cli = AppGroup('stats', help='Estadísticas materializadas por usuario.')
+
+
+# ---------------------------
+# RECÁLCULO DESDE LAS TABLAS BASE
+# ---------------------------
+def _contar(connection, user_id):
+    row = connection.execute(select(
+        select(func.count(Task.id)).where(Task.user_id == user_id).scalar_subquery(),
+        select(func.count(Task.id)).where(Task.user_id == user_id, Task.completed == True).scalar_subquery(),  # noqa: E712
+        select(func.count(Goal.id)).where(Goal.user_id == user_id).scalar_subquery(),
+        select(func.count(Goal.id)).where(Goal.user_id == user_id, Goal.completed == True).scalar_subquery(),  # noqa: E712
+    )).one()
+    return dict(total_tasks=row[0], done_tasks=row[1], total_goals=row[2], done_goals=row[3])
+
+
+def _guardar(connection, user_id, valores):
+    valores = dict(valores, updated_at=datetime.utcnow())
+    result = connection.execute(
+        update(UserStats.__table__).where(UserStats.user_id == user_id).values(**valores)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(UserStats.__table__).values(user_id=user_id, **valores))
+
+
+def rebuild_user_stats(user_id, connection=None):
+    """Recalcula la fila de un usuario desde `task` y `goal`."""
+    connection = connection or db.session.connection()
+    _guardar(connection, user_id, _contar(connection, user_id))
+
+
+def rebuild_all(connection=None):
+    """Recalcula las estadísticas de todos los usuarios con dos consultas agrupadas."""
+    connection = connection or db.session.connection()
+    valores = {
+        user_id: dict(total_tasks=0, done_tasks=0, total_goals=0, done_goals=0)
+        for user_id in connection.execute(select(User.id)).scalars()
+    }
+    for model, (total, done) in _CAMPOS.items():
+        rows = connection.execute(
+            select(
+                model.user_id,
+                func.count(model.id),
+                func.sum(case((model.completed == True, 1), else_=0)),  # noqa: E712
+            )
+            .where(model.user_id.isnot(None))
+            .group_by(model.user_id)
+        )
+        for user_id, n_total, n_done in rows:
+            if user_id in valores:
+                valores[user_id][total] = n_total
+                valores[user_id][done] = n_done or 0
+    for user_id, fila in valores.items():
+        _guardar(connection, user_id, fila)
+    return len(valores)
+
+
+def apply_delta(user_id, connection=None, **deltas):
+    """
+    Suma incrementos a la fila del usuario. Pensado para rutas que
+    escriben con sentencias masivas y no pasan por el flush del ORM.
+    """
+    connection = connection or db.session.connection()
+    valores = {col: getattr(UserStats, col) + n for col, n in deltas.items() if n}
+    if not valores:
+        return
+    valores['updated_at'] = datetime.utcnow()
+    result = connection.execute(
+        update(UserStats.__table__).where(UserStats.user_id == user_id).values(**valores)
+    )
+    if result.rowcount == 0:
+        rebuild_user_stats(user_id, connection)
+
+
+def get_user_stats(user_id):
+    """
+    Accesor único: devuelve la fila `UserStats` del usuario. La migración
+    y el registro la crean; si aun así falta, se calcula dentro de la
+    transacción en curso, sin confirmarla (es una lectura).
+    """
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        rebuild_user_stats(user_id)
+        stats = db.session.get(UserStats, user_id)
+    return stats
+
+
+# ---------------------------
+# HOOKS DE ESCRITURA
+# ---------------------------
+def _valor(state, attr, anterior):
+    """
+    Valor actual (o anterior al flush) de un atributo según su historial.
+    Devuelve (valor, conocido).
+    """
+    hist = state.attrs[attr].history
+    if anterior:
+        if hist.deleted:
+            return hist.deleted[0], True
+        if hist.unchanged:
+            return hist.unchanged[0], True
+        return None, not hist.added
+    if attr in state.dict:
+        return state.dict[attr], True
+    return None, False
+
+
+def _after_flush(session, flush_context):
+    deltas = defaultdict(Counter)
+    recalcular = set()
+
+    def aportar(state, total, done, anterior, signo):
+        user_id, ok_user = _valor(state, 'user_id', anterior)
+        completed, ok_done = _valor(state, 'completed', anterior)
+        if not (ok_user and ok_done):
+            uid = user_id if ok_user else state.dict.get('user_id')
+            if uid is not None:
+                recalcular.add(uid)
+            return
+        if user_id is None:
+            return
+        deltas[user_id][total] += signo
+        if completed:
+            deltas[user_id][done] += signo
+
+    for obj in session.new:
+        campos = _CAMPOS.get(type(obj))
+        if campos:
+            aportar(inspect(obj), *campos, anterior=False, signo=1)
+    for obj in session.deleted:
+        campos = _CAMPOS.get(type(obj))
+        if campos:
+            aportar(inspect(obj), *campos, anterior=True, signo=-1)
+    for obj in session.dirty:
+        campos = _CAMPOS.get(type(obj))
+        if not campos:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[a].history.has_changes() for a in ('user_id', 'completed')):
+            continue
+        aportar(state, *campos, anterior=True, signo=-1)
+        aportar(state, *campos, anterior=False, signo=1)
+
+    if not deltas and not recalcular:
+        return
+    connection = session.connection()
+    for user_id in recalcular:
+        rebuild_user_stats(user_id, connection)
+        deltas.pop(user_id, None)
+    for user_id, delta in deltas.items():
+        apply_delta(user_id, connection, **delta)
+
+
+# ---------------------------
+# COMANDO DE REPARACIÓN
+# ---------------------------
+@stats_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Reconstruir sólo este usuario.')
+def rebuild_command(user_id):
+    """Reconstruye user_stats desde las tablas base."""
+    if user_id is not None:
+        rebuild_user_stats(user_id)
+        total = 1
+    else:
+        total = rebuild_all()
+    db.session.commit()
+    click.echo(f"Estadísticas reconstruidas para {total} usuario(s).")
+
+
+def init_app(app):
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+    app.cli.add_command(stats_cli)
@@ -0,0 +1,64 @@
+"""
+Respuestas JSON por trozos.
+
+`stream_json` emite un objeto JSON a medida que se recorren sus valores,
+en lugar de construirlo entero en memoria con `jsonify`. Los valores que
+son iteradores (por ejemplo, una consulta recorrida con `filas`) se
+escriben como arrays elemento a elemento.
+"""
+from flask import current_app, stream_with_context
+
+from app.db import db
+
+# Elementos que se agrupan en cada trozo enviado al cliente
+CHUNK_ITEMS = 200
+# Filas que se leen de cada vez al recorrer una consulta
+YIELD_ROWS = 500
+
+
+def filas(query):
+    """
+    Recorre una consulta por lotes mientras se envía la respuesta.
+
+    La consulta se crea en la vista, pero la sesión de la vista se cierra
+    al volver de ella; aquí se ejecuta con la sesión activa dentro del
+    stream, que se libera (y devuelve su conexión al pool) al terminar.
+    """
+    yield from query.with_session(db.session()).yield_per(YIELD_ROWS)
+
+
+def _array(items, dumps):
+    yield "["
+    trozo = []
+    primero = True
+    for item in items:
+        trozo.append(dumps(item))
+        if len(trozo) >= CHUNK_ITEMS:
+            yield ("" if primero else ",") + ",".join(trozo)
+            primero = False
+            trozo = []
+    if trozo:
+        yield ("" if primero else ",") + ",".join(trozo)
+    yield "]"
+
+
+def json_chunks(partes):
+    """Genera el texto JSON de un objeto {clave: valor} por trozos."""
+    dumps = current_app.json.dumps
+    yield "{"
+    for i, (clave, valor) in enumerate(partes.items()):
+        yield ("," if i else "") + dumps(clave) + ":"
+        if isinstance(valor, (dict, list, str, int, float, bool)) or valor is None:
+            yield dumps(valor)
+        else:
+            yield from _array(valor, dumps)
+    yield "}"
+
+
+def stream_json(partes, status=200):
+    """Respuesta `application/json` que se va enviando mientras se genera."""
+    return current_app.response_class(
+        stream_with_context(json_chunks(partes)),
+        status=status,
+        mimetype="application/json",
+    )
@@ -0,0 +1,180 @@
+"""
+Sincronización incremental de tareas y subtareas.
+
+Cada flush que escribe tareas o subtareas de un usuario incrementa su
+secuencia (`user_stats.task_seq`) y la graba en `change_seq` de las filas
+tocadas; los borrados dejan una lápida en `task_tombstones`. Un cliente
+guarda el último token y pide sólo lo que cambió desde entonces.
+Los cambios en subtareas también marcan la tarea padre, de modo que el
+feed devuelve la tarea con su lista de subtareas actualizada.
+
+`flask sync prune` borra las lápidas de más de TOMBSTONE_RETENTION_DAYS
+días y sube `user_stats.task_seq_min` hasta la última purgada: un token
+anterior ya no puede saber qué se borró y recibe la lista completa.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+
+from app.db import db
+from app.models import Subtask, Task, TaskTombstone, UserStats
+from app.utils.stats import rebuild_user_stats
+
+sync_cli = AppGroup('sync', help='Sincronización incremental de tareas.')
+
+
+def next_seq(connection, user_id):
+    """Reserva el siguiente número de secuencia del usuario."""
+    stmt = (
+        update(UserStats.__table__)
+        .where(UserStats.user_id == user_id)
+        .values(task_seq=UserStats.task_seq + 1)
+    )
+    if connection.execute(stmt).rowcount == 0:
+        rebuild_user_stats(user_id, connection)
+        connection.execute(stmt)
+    return connection.execute(
+        select(UserStats.task_seq).where(UserStats.user_id == user_id)
+    ).scalar()
+
+
+def seq_range(user_id):
+    """(task_seq_min, task_seq) del usuario: los tokens válidos están en ese rango."""
+    row = db.session.execute(
+        select(UserStats.task_seq_min, UserStats.task_seq).where(UserStats.user_id == user_id)
+    ).first()
+    return (row.task_seq_min, row.task_seq) if row else (0, 0)
+
+
+def prune_tombstones(before, connection=None):
+    """
+    Borra las lápidas anteriores a `before` y sube task_seq_min de cada
+    usuario afectado. Devuelve cuántas se borraron.
+    """
+    connection = connection or db.session.connection()
+    limites = connection.execute(
+        select(TaskTombstone.user_id, func.max(TaskTombstone.change_seq))
+        .where(TaskTombstone.deleted_at < before)
+        .group_by(TaskTombstone.user_id)
+    ).all()
+    total = 0
+    for user_id, seq in limites:
+        connection.execute(
+            update(UserStats.__table__)
+            .where(UserStats.user_id == user_id, UserStats.task_seq_min < seq)
+            .values(task_seq_min=seq)
+        )
+        # Por secuencia y no por fecha: no quedan huecos por debajo de task_seq_min
+        total += connection.execute(
+            delete(TaskTombstone.__table__)
+            .where(TaskTombstone.user_id == user_id, TaskTombstone.change_seq <= seq)
+        ).rowcount
+    return total
+
+
+def _owners(connection, objs):
+    """
+    Usuario dueño de cada tarea o subtarea, y tarea padre de las subtareas.
+    Las subtareas sin la tarea cargada se resuelven con una sola consulta.
+    """
+    por_tarea = {}
+    pendientes = set()
+    for obj in objs:
+        if isinstance(obj, Subtask):
+            parent = inspect(obj).dict.get('task')
+            if parent is not None:
+                por_tarea[obj.task_id or parent.id] = parent.user_id
+            elif obj.task_id is not None:
+                pendientes.add(obj.task_id)
+    pendientes -= set(por_tarea)
+    if pendientes:
+        por_tarea.update(connection.execute(
+            select(Task.id, Task.user_id).where(Task.id.in_(pendientes))
+        ).all())
+
+    result = {}
+    for obj in objs:
+        if isinstance(obj, Task):
+            result[obj] = (obj.user_id, None)
+        else:
+            parent = inspect(obj).dict.get('task')
+            task_id = parent.id if parent is not None else obj.task_id
+            user_id = parent.user_id if parent is not None else por_tarea.get(task_id)
+            result[obj] = (user_id, task_id)
+    return result
+
+
+def _before_flush(session, flush_context, instances):
+    cambiados = defaultdict(list)   # user_id -> objetos nuevos o modificados
+    borrados = defaultdict(list)    # user_id -> objetos borrados
+    padres = defaultdict(set)       # user_id -> tareas cuyas subtareas cambian
+
+    candidatos = [(obj, False) for obj in session.new]
+    candidatos += [(obj, False) for obj in session.dirty if session.is_modified(obj)]
+    candidatos += [(obj, True) for obj in session.deleted]
+    candidatos = [(obj, borrado) for obj, borrado in candidatos if isinstance(obj, (Task, Subtask))]
+    if not candidatos:
+        return
+
+    connection = session.connection()
+    owners = _owners(connection, [obj for obj, _ in candidatos])
+    for obj, borrado in candidatos:
+        user_id, parent_id = owners[obj]
+        if user_id is None:
+            continue
+        (borrados if borrado else cambiados)[user_id].append(obj)
+        if parent_id is not None:
+            padres[user_id].add(parent_id)
+
+    now = datetime.utcnow()
+    for user_id in set(cambiados) | set(borrados):
+        seq = next_seq(connection, user_id)
+        for obj in cambiados[user_id]:
+            obj.change_seq = seq
+        tareas_borradas = {obj.id for obj in borrados[user_id] if isinstance(obj, Task)}
+        lapidas = []
+        for obj in borrados[user_id]:
+            es_tarea = isinstance(obj, Task)
+            if not es_tarea and obj.task_id in tareas_borradas:
+                continue  # la lápida de la tarea ya cubre sus subtareas
+            lapidas.append(dict(
+                user_id=user_id,
+                entity='task' if es_tarea else 'subtask',
+                entity_id=obj.id,
+                task_id=None if es_tarea else obj.task_id,
+                change_seq=seq,
+                deleted_at=now,
+            ))
+        if lapidas:
+            connection.execute(insert(TaskTombstone.__table__), lapidas)
+        tocar = padres[user_id] - tareas_borradas
+        if tocar:
+            connection.execute(
+                update(Task.__table__)
+                .where(Task.id.in_(tocar))
+                .values(change_seq=seq, updated_at=now)
+            )
+
+
+# ---------------------------
+# RETENCIÓN DE LÁPIDAS
+# ---------------------------
+@sync_cli.command('prune')
+@click.option('--days', type=int, default=None, help='Por defecto, TOMBSTONE_RETENTION_DAYS.')
+def prune_command(days):
+    """Borra las lápidas antiguas; los clientes con tokens anteriores recibirán la lista completa."""
+    if days is None:
+        days = current_app.config.get('TOMBSTONE_RETENTION_DAYS', 90)
+    total = prune_tombstones(datetime.utcnow() - timedelta(days=days))
+    db.session.commit()
+    click.echo(f"{total} lápida(s) borrada(s).")
+
+
+def init_app(app):
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+    app.cli.add_command(sync_cli)
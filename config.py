@@ -12,6 +12,54 @@ class Config:
     SQLALCHEMY_ECHO = False
     PERMANENT_SESSION_LIFETIME = 3600 * 24  # 24 horas
 
+    # Pool de conexiones por proceso (app/utils/pool.py). gunicorn.conf.py
+    # fija DB_POOL_SIZE según los hilos de cada worker si no se indica.
+    # Tiempos en segundos salvo DB_STATEMENT_TIMEOUT (ms, sólo Postgres y sólo
+    # en los workers de gunicorn; 0 = sin límite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 2))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 15000))
+
+    # Perfil de SQLite (app/utils/sqlite.py): WAL, espera ante bloqueos (ms),
+    # caché por conexión (KB), lectura mapeada (bytes) y, opcionalmente,
+    # peticiones de escritura de una en una entre todos los workers
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', '1').lower() not in ('0', 'false', 'no')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_WRITE_LOCK = os.environ.get('SQLITE_WRITE_LOCK', '0').lower() in ('1', 'true', 'yes')
+    SQLITE_WRITE_LOCK_TIMEOUT = float(os.environ.get('SQLITE_WRITE_LOCK_TIMEOUT', 10))
+
+    # Hash de contraseñas: algoritmo (scrypt | pbkdf2) y coste (N de scrypt o
+    # iteraciones de pbkdf2; vacío = el de Werkzeug). Hilos que calculan
+    # hashes por proceso, peticiones que pueden esperar turno y segundos de espera
+    PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'scrypt')
+    PASSWORD_HASH_COST = int(os.environ.get('PASSWORD_HASH_COST', 0)) or None
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 5))
+
+    # Identidad de la sesión cacheada en memoria: segundos y nº de usuarios
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 4096))
+
+    # Token para GET /api/metrics/* (cabecera "Authorization: Bearer ..."); vacío = desactivado
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Expansión de RRULE en /api/events?expand=1: días máximos de la ventana
+    # y ocurrencias máximas por tarea (por encima se responde 400)
+    RRULE_MAX_WINDOW_DAYS = int(os.environ.get('RRULE_MAX_WINDOW_DAYS', 400))
+    RRULE_MAX_OCCURRENCES = int(os.environ.get('RRULE_MAX_OCCURRENCES', 1000))
+
+    # Días que se conservan las lápidas de tareas borradas (flask sync prune)
+    TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 90))
+
+    # Codificar las respuestas JSON con orjson cuando esté instalado
+    FAST_JSON = os.environ.get('FAST_JSON', '1').lower() not in ('0', 'false', 'no')
+
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.example.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
     MAIL_USE_TLS = True
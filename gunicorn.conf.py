@@ -0,0 +1,62 @@
+# Perfil de producción de gunicorn (gunicorn -c gunicorn.conf.py run:app).
+#
+# Casi todas las rutas esperan a la base de datos, así que por defecto se
+# usan workers con hilos (gthread). Con WEB_WORKER_CLASS=gevent cada
+# worker atiende muchas peticiones cooperativas (requiere `pip install
+# gevent`); con WEB_WORKER_CLASS=sync se vuelve al modo clásico.
+#
+# Variables de entorno:
+#   PORT               puerto (por defecto 8000)
+#   WEB_WORKER_CLASS   gthread | gevent | sync
+#   WEB_CONCURRENCY    procesos (por defecto según núcleos y modo)
+#   WEB_THREADS        hilos por proceso en gthread (por defecto 4)
+#   WEB_CONNECTIONS    peticiones simultáneas por proceso en gevent (por defecto 200)
+#   WEB_TIMEOUT        segundos antes de reiniciar un worker bloqueado
+#   DB_POOL_SIZE       conexiones por worker (por defecto, una por hilo)
+import multiprocessing
+import os
+
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    # Hay que parchear antes de que preload_app importe la aplicación
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()  # psycopg2 cede el control mientras espera a Postgres
+    except ImportError:
+        pass
+
+_cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Con hilos o gevent la concurrencia la dan los hilos/greenlets; con sync, los procesos
+workers = int(os.environ.get('WEB_CONCURRENCY', _cores * 2 + 1 if worker_class == 'sync' else _cores + 1))
+threads = int(os.environ.get('WEB_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('WEB_CONNECTIONS', 200))
+
+# Una conexión a la base de datos por hilo; con gevent se limita y el resto
+# de greenlets esperan turno en el pool (DB_POOL_TIMEOUT)
+os.environ.setdefault('DB_POOL_SIZE', str({'gthread': threads, 'gevent': min(worker_connections, 10)}.get(worker_class, 1)))
+
+# La aplicación se importa una vez en el maestro y los workers la heredan
+preload_app = True
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+
+# Reciclar workers de vez en cuando acota fugas de memoria
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas en el maestro no se pueden compartir entre procesos:
+    # cada worker empieza con un pool vacío (close=False no cierra las del maestro).
+    # Sólo los workers web limitan la duración de las sentencias (DB_STATEMENT_TIMEOUT)
+    from app.utils import pool
+    pool.limit_statements(worker.app.wsgi())
@@ -51,6 +51,20 @@ def get_metadata():
     return target_db.metadata
 
 
+# Estructuras del índice de búsqueda que no están en los modelos (ver
+# app/utils/search.py): la tabla FTS5 y sus tablas internas en SQLite, y
+# la columna tsv con su índice en Postgres. Autogenerate no debe borrarlas.
+SEARCH_INDEX_OBJECTS = {('column', 'tsv'), ('index', 'ix_search_documents_tsv')}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and name.startswith('search_fts'):
+        return False
+    if reflected and compare_to is None and (type_, name) in SEARCH_INDEX_OBJECTS:
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +79,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +108,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
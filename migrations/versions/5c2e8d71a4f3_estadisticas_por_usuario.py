@@ -0,0 +1,47 @@
+"""Estadisticas materializadas por usuario
+
+Revision ID: 5c2e8d71a4f3
+Revises: 1617b91bc6cc
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8d71a4f3'
+down_revision = '1617b91bc6cc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_tasks', sa.Integer(), nullable=False),
+    sa.Column('done_tasks', sa.Integer(), nullable=False),
+    sa.Column('total_goals', sa.Integer(), nullable=False),
+    sa.Column('done_goals', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_user_stats_user_id'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Rellenar con los totales actuales
+    op.execute(
+        """
+        INSERT INTO user_stats (user_id, total_tasks, done_tasks, total_goals, done_goals, updated_at)
+        SELECT u.id,
+               (SELECT COUNT(*) FROM task t WHERE t.user_id = u.id),
+               (SELECT COUNT(*) FROM task t WHERE t.user_id = u.id AND t.completed = TRUE),
+               (SELECT COUNT(*) FROM goal g WHERE g.user_id = u.id),
+               (SELECT COUNT(*) FROM goal g WHERE g.user_id = u.id AND g.completed = TRUE),
+               CURRENT_TIMESTAMP
+        FROM "user" u
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
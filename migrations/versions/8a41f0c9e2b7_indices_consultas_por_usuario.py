@@ -0,0 +1,46 @@
+"""Indices compuestos para las consultas por usuario
+
+Revision ID: 8a41f0c9e2b7
+Revises: 5c2e8d71a4f3
+Create Date: 2026-10-18 11:03:17.284561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a41f0c9e2b7'
+down_revision = '5c2e8d71a4f3'
+branch_labels = None
+depends_on = None
+
+# (nombre, tabla, columnas)
+INDICES = [
+    ('ix_task_user_id_start', 'task', ['user_id', 'start']),
+    ('ix_task_user_id_completed', 'task', ['user_id', 'completed']),
+    ('ix_schedule_tasks_user_id_date', 'schedule_tasks', ['user_id', 'date']),
+    ('ix_goal_user_id_order_created_at', 'goal', ['user_id', 'order', 'created_at']),
+    ('ix_events_user_id_start', 'events', ['user_id', 'start']),
+    ('ix_subtask_task_id', 'subtask', ['task_id']),
+    ('ix_category_user_id_name', 'category', ['user_id', 'name']),
+    ('ix_templates_user_id', 'templates', ['user_id']),
+    ('ix_password_entries_user_id_created_at', 'password_entries', ['user_id', 'created_at']),
+    ('ix_diario_temas_user_id', 'diario_temas', ['user_id']),
+    ('ix_diario_categorias_tema_id', 'diario_categorias', ['tema_id']),
+    ('ix_diario_subcategorias_categoria_id', 'diario_subcategorias', ['categoria_id']),
+    ('ix_diario_apartados_user_id', 'diario_apartados', ['user_id']),
+    ('ix_diario_apartados_tema_id', 'diario_apartados', ['tema_id']),
+    ('ix_diario_apartados_categoria_id', 'diario_apartados', ['categoria_id']),
+    ('ix_diario_apartados_subcategoria_id', 'diario_apartados', ['subcategoria_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDICES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDICES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,30 @@
+"""Contadores de escrituras por recurso para las respuestas condicionales
+
+Revision ID: a2c7e94f18b3
+Revises: f6d2a8b31c47
+Create Date: 2026-10-18 18:20:51.604219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c7e94f18b3'
+down_revision = 'f6d2a8b31c47'
+branch_labels = None
+depends_on = None
+
+COLUMNAS = ['goal_seq', 'category_seq', 'schedule_seq', 'template_seq', 'diario_seq']
+
+
+def upgrade():
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        for columna in COLUMNAS:
+            batch_op.add_column(sa.Column(columna, sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        for columna in reversed(COLUMNAS):
+            batch_op.drop_column(columna)
@@ -0,0 +1,60 @@
+"""Claves de orden fraccionarias para las metas
+
+Revision ID: a9c04e6b7d13
+Revises: f3a85c21d9e6
+Create Date: 2026-10-18 15:10:44.902615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c04e6b7d13'
+down_revision = 'f3a85c21d9e6'
+branch_labels = None
+depends_on = None
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def _claves(n):
+    """n claves crecientes con parte entera de longitud fija ('c' + 3 dígitos)."""
+    claves = []
+    for i in range(n):
+        resto, digitos = i, ''
+        for _ in range(3):
+            resto, d = divmod(resto, len(DIGITS))
+            digitos = DIGITS[d] + digitos
+        claves.append('c' + digitos)
+    return claves
+
+
+def upgrade():
+    order_key = sa.String(length=64).with_variant(sa.String(length=64, collation='C'), 'postgresql')
+    with op.batch_alter_table('goal', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('position', order_key, nullable=True))
+
+    # Respetar el orden actual de cada usuario: order ascendente, más recientes primero
+    conn = op.get_bind()
+    filas = conn.execute(sa.text(
+        'SELECT id, user_id FROM goal ORDER BY user_id, "order", created_at DESC'
+    )).fetchall()
+    por_usuario = {}
+    for goal_id, user_id in filas:
+        por_usuario.setdefault(user_id, []).append(goal_id)
+    for ids in por_usuario.values():
+        conn.execute(
+            sa.text('UPDATE goal SET position = :position WHERE id = :id'),
+            [{'id': goal_id, 'position': clave} for goal_id, clave in zip(ids, _claves(len(ids)))],
+        )
+
+    op.drop_index('ix_goal_user_id_order_created_at', table_name='goal')
+    op.create_index('ix_goal_user_id_position', 'goal', ['user_id', 'position'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_goal_user_id_position', table_name='goal')
+    op.create_index('ix_goal_user_id_order_created_at', 'goal', ['user_id', 'order', 'created_at'], unique=False)
+    with op.batch_alter_table('goal', schema=None) as batch_op:
+        batch_op.drop_column('position')
@@ -0,0 +1,24 @@
+"""Indice por fecha fin de las tareas recurrentes del horario
+
+Revision ID: b3d7e15a90c2
+Revises: 8a41f0c9e2b7
+Create Date: 2026-10-18 11:48:05.917342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d7e15a90c2'
+down_revision = '8a41f0c9e2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_schedule_tasks_user_id_end_date', 'schedule_tasks', ['user_id', 'end_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_schedule_tasks_user_id_end_date', table_name='schedule_tasks')
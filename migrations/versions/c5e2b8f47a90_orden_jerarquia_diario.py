@@ -0,0 +1,68 @@
+"""Claves de orden en los cuatro niveles del diario
+
+Revision ID: c5e2b8f47a90
+Revises: a9c04e6b7d13
+Create Date: 2026-10-18 15:48:21.507733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2b8f47a90'
+down_revision = 'a9c04e6b7d13'
+branch_labels = None
+depends_on = None
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# (tabla, columna que agrupa cada lista, índice anterior, índice nuevo)
+LISTAS = [
+    ('diario_temas', 'user_id', 'ix_diario_temas_user_id', 'ix_diario_temas_user_id_position'),
+    ('diario_categorias', 'tema_id', 'ix_diario_categorias_tema_id', 'ix_diario_categorias_tema_id_position'),
+    ('diario_subcategorias', 'categoria_id', 'ix_diario_subcategorias_categoria_id',
+     'ix_diario_subcategorias_categoria_id_position'),
+    ('diario_apartados', 'user_id', 'ix_diario_apartados_user_id', 'ix_diario_apartados_user_id_position'),
+]
+
+
+def _claves(n):
+    """n claves crecientes con parte entera de longitud fija ('c' + 3 dígitos)."""
+    claves = []
+    for i in range(n):
+        resto, digitos = i, ''
+        for _ in range(3):
+            resto, d = divmod(resto, len(DIGITS))
+            digitos = DIGITS[d] + digitos
+        claves.append('c' + digitos)
+    return claves
+
+
+def upgrade():
+    order_key = sa.String(length=64).with_variant(sa.String(length=64, collation='C'), 'postgresql')
+    conn = op.get_bind()
+    for tabla, grupo, anterior, nuevo in LISTAS:
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('position', order_key, nullable=True))
+
+        # Orden inicial: el de creación (id) dentro de cada lista
+        listas = {}
+        for item_id, valor in conn.execute(sa.text(f'SELECT id, {grupo} FROM {tabla} ORDER BY {grupo}, id')):
+            listas.setdefault(valor, []).append(item_id)
+        for ids in listas.values():
+            conn.execute(
+                sa.text(f'UPDATE {tabla} SET position = :position WHERE id = :id'),
+                [{'id': item_id, 'position': clave} for item_id, clave in zip(ids, _claves(len(ids)))],
+            )
+
+        op.drop_index(anterior, table_name=tabla)
+        op.create_index(nuevo, tabla, [grupo, 'position'], unique=False)
+
+
+def downgrade():
+    for tabla, grupo, anterior, nuevo in reversed(LISTAS):
+        op.drop_index(nuevo, table_name=tabla)
+        op.create_index(anterior, tabla, [grupo], unique=False)
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.drop_column('position')
@@ -0,0 +1,26 @@
+"""Secuencia mínima válida para los tokens de sincronización
+
+Revision ID: c8f1e36d9a47
+Revises: a2c7e94f18b3
+Create Date: 2026-10-18 19:04:37.218406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1e36d9a47'
+down_revision = 'a2c7e94f18b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('task_seq_min', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.drop_column('task_seq_min')
@@ -0,0 +1,29 @@
+"""Indice de reglas recurrentes activas del horario
+
+Revision ID: d62c4b8f1e05
+Revises: b3d7e15a90c2
+Create Date: 2026-10-18 12:20:44.136720
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd62c4b8f1e05'
+down_revision = 'b3d7e15a90c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (user_id, recurrence, end_date) sirve tanto a las reglas con fin como a
+    # las abiertas (end_date nulo) sin tocar las tareas puntuales.
+    op.drop_index('ix_schedule_tasks_user_id_end_date', table_name='schedule_tasks')
+    op.create_index('ix_schedule_tasks_user_id_recurrence_end_date', 'schedule_tasks',
+                    ['user_id', 'recurrence', 'end_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_schedule_tasks_user_id_recurrence_end_date', table_name='schedule_tasks')
+    op.create_index('ix_schedule_tasks_user_id_end_date', 'schedule_tasks', ['user_id', 'end_date'], unique=False)
@@ -0,0 +1,30 @@
+"""Versión por elemento del diario para la sincronización por diferencias
+
+Revision ID: d81f3a6c02b5
+Revises: c5e2b8f47a90
+Create Date: 2026-10-18 16:31:09.148826
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3a6c02b5'
+down_revision = 'c5e2b8f47a90'
+branch_labels = None
+depends_on = None
+
+TABLAS = ['diario_temas', 'diario_categorias', 'diario_subcategorias', 'diario_apartados']
+
+
+def upgrade():
+    for tabla in TABLAS:
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for tabla in reversed(TABLAS):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.drop_column('version')
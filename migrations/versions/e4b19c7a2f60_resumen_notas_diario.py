@@ -0,0 +1,56 @@
+"""Título y extracto precalculados de las notas del diario
+
+Revision ID: e4b19c7a2f60
+Revises: d81f3a6c02b5
+Create Date: 2026-10-18 17:12:40.385127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b19c7a2f60'
+down_revision = 'd81f3a6c02b5'
+branch_labels = None
+depends_on = None
+
+LOTE = 500
+
+
+def _resumen(contenido):
+    # Igual que DiarioApartado.resumen
+    texto = contenido or ''
+    return texto.split('\n', 1)[0][:50], texto[:200]
+
+
+def upgrade():
+    with op.batch_alter_table('diario_apartados', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('titulo', sa.String(length=50), server_default='', nullable=False))
+        batch_op.add_column(sa.Column('extracto', sa.String(length=200), server_default='', nullable=False))
+
+    # Relleno por lotes de id para no cargar todo el diario a la vez
+    conn = op.get_bind()
+    ultimo = 0
+    while True:
+        filas = conn.execute(
+            sa.text('SELECT id, contenido FROM diario_apartados WHERE id > :ultimo ORDER BY id LIMIT :lote'),
+            {'ultimo': ultimo, 'lote': LOTE},
+        ).all()
+        if not filas:
+            break
+        cambios = []
+        for item_id, contenido in filas:
+            titulo, extracto = _resumen(contenido)
+            cambios.append({'id': item_id, 'titulo': titulo, 'extracto': extracto})
+        conn.execute(
+            sa.text('UPDATE diario_apartados SET titulo = :titulo, extracto = :extracto WHERE id = :id'),
+            cambios,
+        )
+        ultimo = filas[-1][0]
+
+
+def downgrade():
+    with op.batch_alter_table('diario_apartados', schema=None) as batch_op:
+        batch_op.drop_column('extracto')
+        batch_op.drop_column('titulo')
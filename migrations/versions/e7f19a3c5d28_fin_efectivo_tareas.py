@@ -0,0 +1,38 @@
+"""Fin efectivo de las tareas para consultas por solapamiento
+
+Revision ID: e7f19a3c5d28
+Revises: d62c4b8f1e05
+Create Date: 2026-10-18 13:05:52.660418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7f19a3c5d28'
+down_revision = 'd62c4b8f1e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('end_effective', sa.Date(), nullable=True))
+
+    # Tareas con RRULE: sin fin conocido (date.max); el resto: end o start
+    op.execute(
+        """
+        UPDATE task SET end_effective = CASE
+            WHEN rrule_text IS NOT NULL AND rrule_text <> '' THEN '9999-12-31'
+            ELSE COALESCE("end", start)
+        END
+        """
+    )
+    op.create_index('ix_task_user_id_end_effective_start', 'task', ['user_id', 'end_effective', 'start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_user_id_end_effective_start', table_name='task')
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('end_effective')
@@ -0,0 +1,60 @@
+"""Secuencia de cambios y lápidas para la sincronización incremental de tareas
+
+Revision ID: f3a85c21d9e6
+Revises: e7f19a3c5d28
+Create Date: 2026-10-18 14:22:07.318254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a85c21d9e6'
+down_revision = 'e7f19a3c5d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('task_seq', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_task_user_id_change_seq', ['user_id', 'change_seq'], unique=False)
+
+    with op.batch_alter_table('subtask', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+
+    op.create_table('task_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=10), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=True),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_task_tombstones_user_id'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_tombstones_user_id_change_seq', 'task_tombstones', ['user_id', 'change_seq'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_tombstones_user_id_change_seq', table_name='task_tombstones')
+    op.drop_table('task_tombstones')
+
+    with op.batch_alter_table('subtask', schema=None) as batch_op:
+        batch_op.drop_column('change_seq')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_user_id_change_seq')
+        batch_op.drop_column('change_seq')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.drop_column('task_seq')
@@ -0,0 +1,92 @@
+"""Índice de búsqueda de texto completo (FTS5 en SQLite, tsvector en Postgres)
+
+Revision ID: f6d2a8b31c47
+Revises: e4b19c7a2f60
+Create Date: 2026-10-18 17:46:03.912354
+
+"""
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6d2a8b31c47'
+down_revision = 'e4b19c7a2f60'
+branch_labels = None
+depends_on = None
+
+# Igual que app/utils/search.py
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE search_fts USING fts5("
+    "title, body, content='search_documents', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+POSTGRES_DDL = [
+    "ALTER TABLE search_documents ADD COLUMN tsv tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED",
+    "CREATE INDEX ix_search_documents_tsv ON search_documents USING gin (tsv)",
+]
+
+# Tipo -> consulta (user_id, id, título, cuerpo) sobre la tabla de origen
+ORIGENES = {
+    'nota': 'SELECT user_id, id, titulo, contenido FROM diario_apartados',
+    'meta': "SELECT user_id, id, description, '' FROM goal",
+    'tarea': "SELECT user_id, id, title, '' FROM task WHERE user_id IS NOT NULL",
+    'horario': 'SELECT user_id, id, title, description FROM schedule_tasks',
+}
+
+
+def upgrade():
+    op.create_table('search_documents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=250), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_search_documents_user_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'entity_id', name='uq_search_documents_kind_entity_id')
+    )
+    op.create_index('ix_search_documents_user_id', 'search_documents', ['user_id'], unique=False)
+
+    conn = op.get_bind()
+    for sql in {'sqlite': SQLITE_DDL, 'postgresql': POSTGRES_DDL}.get(conn.dialect.name, []):
+        op.execute(sql)
+
+    # Las subtareas van en el cuerpo del documento de su tarea
+    subtareas = defaultdict(list)
+    for task_id, texto in conn.execute(sa.text('SELECT task_id, text FROM subtask ORDER BY task_id, "order", id')):
+        subtareas[task_id].append(texto)
+
+    for kind, sql in ORIGENES.items():
+        filas = [
+            {'user_id': user_id, 'kind': kind, 'entity_id': entity_id, 'title': (title or '')[:250],
+             'body': '\n'.join(subtareas[entity_id]) if kind == 'tarea' else (body or '')}
+            for user_id, entity_id, title, body in conn.execute(sa.text(sql))
+        ]
+        if filas:
+            conn.execute(
+                sa.text('INSERT INTO search_documents (user_id, kind, entity_id, title, body) '
+                        'VALUES (:user_id, :kind, :entity_id, :title, :body)'),
+                filas,
+            )
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        for trigger in ('search_documents_ai', 'search_documents_ad', 'search_documents_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS search_fts')
+    op.drop_index('ix_search_documents_user_id', table_name='search_documents')
+    op.drop_table('search_documents')